@@ -1,2 +1,3 @@
 from .sml_reader import SmlReader
 from .data_reader import receive, read, read_one
+from .file_reader import iter_sml_files
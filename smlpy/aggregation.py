@@ -0,0 +1,310 @@
+"""
+Streaming aggregation of the values of val list entries into time windows, e.g. the average power and the
+energy consumed per 15 minutes. Every value is folded into the window state at once, so the sml files
+can be dropped right away:
+
+    aggregator = Aggregator([Window(60), Window(900), Window(3600, step=900)])
+    async for record in aggregate(data_reader.main(port_settings), aggregator):
+        print(record.obis_code, record.start, record.avg, record.increase)
+
+A window with a step is a sliding window, which is emitted every step seconds. Windows are aligned to
+multiples of their step since the epoch and closed as soon as a value of the same series arrives after
+their end, or when advance or flush is called.
+For counters, e.g. energy registers, the increase within each window is computed as well. A decreasing
+counter is treated as a rollover if rollover is set and the drop is larger than half of it, otherwise
+as a reset to zero.
+"""
+
+import collections
+import dataclasses
+import math
+import time
+import typing
+
+from loguru import logger
+
+from smlpy import obis, sml_reader
+
+# C.8 are the time integrals, i.e. the energy registers
+DEFAULT_COUNTERS = ("*-*:*.8.*",)
+
+
+@dataclasses.dataclass()
+class Window:
+    size: float  # in seconds
+    step: typing.Optional[float] = None  # in seconds, None for a tumbling window
+
+    def __post_init__(self):
+        step = self.size if self.step is None else self.step
+        if step <= 0 or step > self.size:
+            raise ValueError(f"the step of a window must be in (0, {self.size}], not {step}")
+        if not math.isclose(self.size / step, round(self.size / step)):
+            raise ValueError("the size of a window must be a multiple of its step")
+
+    @property
+    def pane_size(self) -> float:
+        return self.size if self.step is None else self.step
+
+    @property
+    def panes(self) -> int:
+        return int(round(self.size / self.pane_size))
+
+
+class WindowRecord(typing.NamedTuple):
+    server_id: bytes
+    obis_code: obis.ObisCode
+    start: float  # seconds since the epoch, inclusive
+    end: float  # seconds since the epoch, exclusive
+    count: int
+    sum: float
+    min: float
+    max: float
+    first: float
+    last: float
+    increase: typing.Optional[float]  # only for counters
+    resets: int
+    unit: str
+
+    @property
+    def avg(self) -> float:
+        return self.sum / self.count
+
+
+class _Pane:
+    """the aggregated values of one step of a window"""
+
+    __slots__ = ("index", "count", "sum", "min", "max", "first", "last", "increase", "resets")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.first = 0.0
+        self.last = 0.0
+        self.increase = 0.0
+        self.resets = 0
+
+    def add(self, value: float, increase: float, reset: bool):
+        if self.count == 0:
+            self.first = value
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.last = value
+        self.increase += increase
+        self.resets += reset
+
+
+class _WindowState:
+    def __init__(self, window: Window):
+        self.window = window
+        self.panes: typing.Deque[_Pane] = collections.deque()  # closed panes of open windows
+        self.current: typing.Optional[_Pane] = None
+        self.emitted_until: typing.Optional[int] = None  # end of the last emitted window, in panes
+
+    def pane_index(self, timestamp: float) -> int:
+        return math.floor(timestamp / self.window.pane_size)
+
+    def add(
+        self, timestamp: float, value: float, increase: float, reset: bool
+    ) -> typing.List[typing.Tuple[int, typing.List[_Pane]]]:
+        index = self.pane_index(timestamp)
+        closed = []
+        if self.current is not None and index > self.current.index:
+            closed = self.advance(index)
+
+        if self.current is not None and index == self.current.index:
+            pane = self.current
+        elif self.emitted_until is not None and index < self.emitted_until:
+            logger.debug(f"dropping value at {timestamp}, its window is already closed")
+            return closed
+        elif self.current is None and (not self.panes or index > self.panes[-1].index):
+            pane = self.current = _Pane(index)
+        else:
+            # a late value, e.g. after the clock went back, within a window which is still open
+            pane = self._get_closed_pane(index)
+        pane.add(value, increase, reset)
+        return closed
+
+    def _get_closed_pane(self, index: int) -> _Pane:
+        for i, pane in enumerate(self.panes):
+            if pane.index == index:
+                return pane
+            if pane.index > index:
+                pane = _Pane(index)
+                self.panes.insert(i, pane)
+                return pane
+        pane = _Pane(index)
+        self.panes.append(pane)
+        return pane
+
+    def advance(self, until: int) -> typing.List[typing.Tuple[int, typing.List[_Pane]]]:
+        """closes all windows which end at or before the pane index until"""
+        if self.current is not None and self.current.index < until:
+            self.panes.append(self.current)
+            self.current = None
+        if not self.panes:
+            return []
+
+        n_panes = self.window.panes
+        first_end = self.panes[0].index + 1
+        if self.emitted_until is not None:
+            first_end = max(first_end, self.emitted_until + 1)
+        last_end = min(until, self.panes[-1].index + n_panes)
+
+        closed = []
+        for end in range(first_end, last_end + 1):
+            panes = [x for x in self.panes if end - n_panes <= x.index < end]
+            if panes:
+                closed.append((end, panes))
+            self.emitted_until = end
+
+        while self.panes and self.panes[0].index < until + 1 - n_panes:
+            self.panes.popleft()
+        return closed
+
+    def flush(self) -> typing.List[typing.Tuple[int, typing.List[_Pane]]]:
+        last = self.current
+        if last is None and self.panes:
+            last = self.panes[-1]
+        if last is None:
+            return []
+        return self.advance(last.index + self.window.panes)
+
+
+class _Series:
+    def __init__(self, windows: typing.Sequence[Window], is_counter: bool):
+        self.states = [_WindowState(x) for x in windows]
+        self.is_counter = is_counter
+        self.last_value: typing.Optional[float] = None
+        self.unit = ""
+
+
+class Aggregator:
+    """
+    Keeps the state of every window for every (server id, obis code). counters are the obis codes or
+    patterns of series for which the increase is computed
+    """
+
+    def __init__(
+        self,
+        windows: typing.Sequence[Window],
+        counters: typing.Iterable[
+            typing.Union[str, obis.ObisCode, obis.ObisPattern]
+        ] = DEFAULT_COUNTERS,
+        rollover: float = None,
+    ):
+        self.windows = list(windows)
+        self.counters = [
+            obis.ObisPattern.from_str(x) if isinstance(x, str) else x for x in counters
+        ]
+        self.rollover = rollover
+        self._series: typing.Dict[typing.Tuple[bytes, obis.ObisCode], _Series] = {}
+
+    def add(
+        self,
+        server_id: bytes,
+        obis_code: obis.ObisCode,
+        timestamp: float,
+        value: float,
+        unit: str = "",
+    ) -> typing.List[WindowRecord]:
+        """folds value into the windows of its series, returns the windows which were closed by it"""
+        key = (server_id, obis_code)
+        series = self._series.get(key)
+        if series is None:
+            is_counter = any(obis_code.matches(x) for x in self.counters)
+            series = _Series(self.windows, is_counter)
+            self._series[key] = series
+        series.unit = unit
+
+        increase, reset = 0.0, False
+        if series.is_counter and series.last_value is not None:
+            increase, reset = self._get_increase(series.last_value, value)
+        series.last_value = value
+
+        records = []
+        for state in series.states:
+            closed = state.add(timestamp, value, increase, reset)
+            records.extend(self._to_records(key, series, state.window, closed))
+        return records
+
+    def process(
+        self, sml_file: sml_reader.SmlFile, timestamp: float = None
+    ) -> typing.List[WindowRecord]:
+        """adds every numeric value of sml_file, returns the windows which were closed"""
+        if timestamp is None:
+            timestamp = time.time()
+
+        records = []
+        for server_id, entry, value in sml_file.get_numeric_values():
+            server_id = sml_reader.server_id_to_bytes(server_id)
+            records.extend(self.add(server_id, entry.obj_name, timestamp, value, entry.unit))
+        return records
+
+    def advance(self, timestamp: float) -> typing.List[WindowRecord]:
+        """closes the windows of all series which end at or before timestamp, e.g. if a meter stopped sending"""
+        records = []
+        for key, series in self._series.items():
+            for state in series.states:
+                closed = state.advance(state.pane_index(timestamp))
+                records.extend(self._to_records(key, series, state.window, closed))
+        return records
+
+    def flush(self) -> typing.List[WindowRecord]:
+        """closes all windows which contain values"""
+        records = []
+        for key, series in self._series.items():
+            for state in series.states:
+                records.extend(self._to_records(key, series, state.window, state.flush()))
+        return records
+
+    def _get_increase(self, last: float, value: float) -> typing.Tuple[float, bool]:
+        increase = value - last
+        if increase >= 0:
+            return increase, False
+        if self.rollover is not None and -increase > self.rollover / 2:
+            return increase + self.rollover, False
+        logger.info(f"counter was reset from {last} to {value}")
+        return value, True
+
+    @staticmethod
+    def _to_records(
+        key: typing.Tuple[bytes, obis.ObisCode],
+        series: _Series,
+        window: Window,
+        closed: typing.List[typing.Tuple[int, typing.List[_Pane]]],
+    ) -> typing.List[WindowRecord]:
+        records = []
+        for end, panes in closed:
+            end_time = end * window.pane_size
+            records.append(
+                WindowRecord(
+                    server_id=key[0],
+                    obis_code=key[1],
+                    start=end_time - window.size,
+                    end=end_time,
+                    count=sum(x.count for x in panes),
+                    sum=sum(x.sum for x in panes),
+                    min=min(x.min for x in panes),
+                    max=max(x.max for x in panes),
+                    first=panes[0].first,
+                    last=panes[-1].last,
+                    increase=sum(x.increase for x in panes) if series.is_counter else None,
+                    resets=sum(x.resets for x in panes),
+                    unit=series.unit,
+                )
+            )
+        return records
+
+
+async def aggregate(
+    sml_files: typing.AsyncIterator[sml_reader.SmlFile], aggregator: Aggregator
+) -> typing.AsyncIterator[WindowRecord]:
+    """yields the windows closed by the received values, windows still open at the end are left to aggregator.flush"""
+    async for sml_file in sml_files:
+        for record in aggregator.process(sml_file):
+            yield record
@@ -0,0 +1,249 @@
+"""
+An archive of the raw frames as received from the meter, e.g. for audits or to parse them again after
+a parser fix. Pass a FrameArchive to data_reader.main or data_reader.receive to fill it:
+
+    archive = FrameArchive("frames")
+    async for sml_file in data_reader.main(port_settings, archive=archive):
+        ...
+
+Frames are appended to segment files together with their receive time and port. Every segment has a
+sidecar index containing the time and position of every index_interval-th frame, so reading a time
+window only has to scan a few frames. Segments are read through mmap:
+
+    for frame, sml_file in ArchiveReader("frames").iter_sml_files(start, end):
+        ...
+
+The index assumes that the receive times do not decrease.
+"""
+
+import bisect
+import dataclasses
+import mmap
+import pathlib
+import struct
+import time
+import typing
+
+from loguru import logger
+
+from smlpy import parse_cache, sml_reader
+
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+DEFAULT_INDEX_INTERVAL = 16
+
+_SEGMENT_SUFFIX = ".frames"
+_INDEX_SUFFIX = ".idx"
+
+# frame length, receive time in microseconds since the epoch, port length
+_record_header = struct.Struct("<IqB")
+# receive time in microseconds since the epoch, offset of the frame
+_index_entry = struct.Struct("<qQ")
+
+
+@dataclasses.dataclass()
+class ArchivedFrame:
+    timestamp: float  # receive time in seconds since the epoch
+    port: str
+    data: bytes
+
+
+def _to_us(timestamp: float) -> int:
+    return int(round(timestamp * 1_000_000))
+
+
+def _segment_paths(path: pathlib.Path) -> typing.List[pathlib.Path]:
+    return sorted(path.glob(f"*{_SEGMENT_SUFFIX}"))
+
+
+def _index_path(segment_path: pathlib.Path) -> pathlib.Path:
+    return segment_path.with_suffix(_INDEX_SUFFIX)
+
+
+class FrameArchive:
+    """The writing side of the archive. Every instance starts a new segment"""
+
+    def __init__(
+        self,
+        path: typing.Union[str, pathlib.Path],
+        segment_size: int = DEFAULT_SEGMENT_SIZE,
+        index_interval: int = DEFAULT_INDEX_INTERVAL,
+    ):
+        self.path = pathlib.Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+        self.index_interval = index_interval
+
+        existing = _segment_paths(self.path)
+        self._next_segment = int(existing[-1].stem) + 1 if existing else 0
+        self._segment: typing.Optional[typing.BinaryIO] = None
+        self._index: typing.Optional[typing.BinaryIO] = None
+        self._frames_in_segment = 0
+        # the index and the readers rely on receive times which never decrease
+        self._last_us = _last_timestamp(existing[-1]) if existing else None
+
+    def append(self, frame: bytes, timestamp: float = None, port: str = ""):
+        """
+        timestamp is the receive time, it must not be before the one of the previous frame.
+        If it is not given, the current time is used, or the previous one if the clock went back
+        """
+        if timestamp is None:
+            timestamp_us = _to_us(time.time())
+            if self._last_us is not None and timestamp_us < self._last_us:
+                logger.debug(f"clock went back from {self._last_us} to {timestamp_us}, using {self._last_us}")
+                timestamp_us = self._last_us
+        else:
+            timestamp_us = _to_us(timestamp)
+            if self._last_us is not None and timestamp_us < self._last_us:
+                raise ValueError(
+                    f"timestamps must not decrease, got {timestamp_us} after {self._last_us}"
+                )
+        port_bytes = port.encode("utf-8")[:255]
+
+        if self._segment is None or self._segment.tell() >= self.segment_size:
+            self._start_segment()
+
+        offset = self._segment.tell()
+        self._segment.write(
+            _record_header.pack(len(frame), timestamp_us, len(port_bytes))
+            + port_bytes
+            + frame
+        )
+        self._segment.flush()
+
+        if self._frames_in_segment % self.index_interval == 0:
+            self._index.write(_index_entry.pack(timestamp_us, offset))
+            self._index.flush()
+        self._frames_in_segment += 1
+        self._last_us = timestamp_us
+
+    def close(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._index.close()
+            self._segment = None
+            self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _start_segment(self):
+        self.close()
+        segment_path = self.path / f"{self._next_segment:08d}{_SEGMENT_SUFFIX}"
+        self._next_segment += 1
+        self._segment = segment_path.open("ab")
+        self._index = _index_path(segment_path).open("ab")
+        self._frames_in_segment = 0
+        logger.debug(f"started archive segment {segment_path}")
+
+
+class ArchiveReader:
+    def __init__(self, path: typing.Union[str, pathlib.Path]):
+        self.path = pathlib.Path(path)
+
+    def iter_frames(
+        self, start: float = None, end: float = None
+    ) -> typing.Iterator[ArchivedFrame]:
+        """yields every frame received between start and end (both inclusive)"""
+        start_us = None if start is None else _to_us(start)
+        end_us = None if end is None else _to_us(end)
+
+        segments = [(x, _read_index(x)) for x in _segment_paths(self.path)]
+        segments = [x for x in segments if x[1]]  # empty segments
+        if start_us is not None:
+            # the last segment starting before start_us may contain it,
+            # equal receive times can span several segments
+            first_times = [index[0][0] for _, index in segments]
+            first = max(bisect.bisect_left(first_times, start_us) - 1, 0)
+            segments = segments[first:]
+
+        for segment_path, index in segments:
+            if end_us is not None and index[0][0] > end_us:
+                return
+            for frame in _iter_segment(segment_path, index, start_us, end_us):
+                yield frame
+
+    def iter_sml_files(
+        self,
+        start: float = None,
+        end: float = None,
+        cache: typing.Optional[parse_cache.ParseCache] = None,
+    ) -> typing.Iterator[typing.Tuple[ArchivedFrame, sml_reader.SmlFile]]:
+        """
+        parses every frame received between start and end, frames which cannot be parsed are skipped.
+        With a cache, repeated frames are only parsed once
+        """
+        for frame in self.iter_frames(start, end):
+            try:
+                sml_file = sml_reader.SmlReader(frame.data.hex(), cache).read_sml_file()
+            except Exception as e:
+                logger.warning(f"could not parse frame received at {frame.timestamp}: {e!r}")
+                continue
+            yield frame, sml_file
+
+
+def _last_timestamp(segment_path: pathlib.Path) -> typing.Optional[int]:
+    """the receive time of the last frame in the segment, in microseconds"""
+    index = _read_index(segment_path)
+    if not index:
+        return None
+    last = None
+    for frame in _iter_segment(segment_path, index, index[-1][0], None):
+        last = frame.timestamp
+    return None if last is None else _to_us(last)
+
+
+def _read_index(segment_path: pathlib.Path) -> typing.List[typing.Tuple[int, int]]:
+    index_path = _index_path(segment_path)
+    if index_path.exists():
+        data = index_path.read_bytes()
+        usable = len(data) - len(data) % _index_entry.size
+        index = list(_index_entry.iter_unpack(data[:usable]))
+        if index:
+            return index
+
+    # the index is missing, fall back to scanning the segment from its start
+    with segment_path.open("rb") as f:
+        header = f.read(_record_header.size)
+    if len(header) < _record_header.size:
+        return []
+    _, timestamp_us, _ = _record_header.unpack(header)
+    return [(timestamp_us, 0)]
+
+
+def _iter_segment(
+    segment_path: pathlib.Path,
+    index: typing.List[typing.Tuple[int, int]],
+    start_us: typing.Optional[int],
+    end_us: typing.Optional[int],
+) -> typing.Iterator[ArchivedFrame]:
+    offset = 0
+    if start_us is not None:
+        # the last indexed frame before start_us, the frames after it are scanned
+        pos = bisect.bisect_left(index, (start_us, 0)) - 1
+        offset = index[max(pos, 0)][1]
+
+    with segment_path.open("rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            while offset + _record_header.size <= size:
+                frame_len, timestamp_us, port_len = _record_header.unpack_from(mm, offset)
+                data_start = offset + _record_header.size + port_len
+                next_offset = data_start + frame_len
+                if next_offset > size:
+                    logger.debug(f"{segment_path} ends with a partial frame")
+                    return
+                if end_us is not None and timestamp_us > end_us:
+                    return
+
+                if start_us is None or timestamp_us >= start_us:
+                    yield ArchivedFrame(
+                        timestamp=timestamp_us / 1_000_000,
+                        port=mm[offset + _record_header.size : data_start].decode(
+                            "utf-8", errors="replace"
+                        ),
+                        data=mm[data_start:next_offset],
+                    )
+                offset = next_offset
@@ -18,9 +18,13 @@ import typing
 from loguru import logger
 from typing_extensions import Literal
 
-from smlpy import sml_reader
+from smlpy import archive as frame_archive
+from smlpy import parse_cache, sml_reader
 
 WAIT_TIME = 5
+IDLE_TIMEOUT = 60
+MAX_FRAME_LENGTH = 2 * 64 * 1024  # in hex chars
+READ_SIZE = 64 * 1024
 
 
 @dataclasses.dataclass()
@@ -36,11 +40,13 @@ class PortSettings:
 async def receive(
         default_portsettings: PortSettings,
         queue: asyncio.Queue,
+        archive: typing.Optional[frame_archive.FrameArchive] = None,
 ):
     """
     Asynchronously receives data from the given port at the settings (for an explanation see pyserial) and puts them
     into the queue.
-    wait_time is used to control the time given to accumulate data. it should be enough
+    wait_time controls how much data is read at once, every complete frame is put into the queue as soon as it arrived.
+    If an archive is given, every received frame is appended to it.
     """
     reader, _ = await serial_asyncio.open_serial_connection(
         url=default_portsettings.port,
@@ -49,41 +55,98 @@ async def receive(
         parity=default_portsettings.parity,
         stopbits=default_portsettings.stopbits,
     )
-    return _read_from_port(reader, queue, default_portsettings.wait_time)
+    return _read_from_port(
+        reader, queue, default_portsettings.wait_time, archive, default_portsettings.port
+    )
 
 
 async def _read_from_port(
-        reader: asyncio.StreamReader, queue: asyncio.Queue, wait_time
+        reader: asyncio.StreamReader,
+        queue: asyncio.Queue,
+        wait_time,
+        archive: typing.Optional[frame_archive.FrameArchive] = None,
+        port: str = "",
 ):
     data = ""
-
-    start = sml_reader.msg_start + sml_reader.msg_version_1
-    end = sml_reader.msg_end + "1a"  # standard... I love sml!
-
     while True:
+        # blocks until something was received, so every frame is handled as soon as it is complete
         msg = await reader.read(1000 * wait_time)
 
-        # we need to find a start and an end in this mess.
         received_data = codecs.encode(msg, "hex").decode("ascii")
 
         logger.info(f"msg length {len(msg)} msg {received_data}")
 
-        data += received_data
-        start_pos = data.find(start)
-        end_pos = data.find(end)
-        if start_pos != -1 and end_pos != -1:
-            value = data[start_pos: end_pos + len(end) + 6]
-            await queue.put(value)
-
-            data = data[end_pos + 4:]
+        # we need to find a start and an end in this mess.
+        frames, data = split_frames(data + received_data)
+        for frame in frames:
+            if archive is not None:
+                archive_frame(archive, frame, port)
+            await queue.put(frame)
             logger.debug("full message received")
-        elif start_pos != -1 and end_pos == -1:
+        if not frames and data:
             logger.debug("partial message received", data=received_data)
-        else:
-            logger.debug("end but no start")
-            data = ""
 
-        await asyncio.sleep(WAIT_TIME)
+
+def split_frames(data: str) -> typing.Tuple[typing.List[str], str]:
+    """
+    Extracts every complete frame from the received hex data. Returns the frames and the rest of the data,
+    which has to be prepended to the next received data
+    """
+    start = sml_reader.msg_start + sml_reader.msg_version_1
+    end = sml_reader.msg_end + "1a"  # standard... I love sml!
+    trailer_len = 6  # number of padding bytes and crc
+
+    frames = []
+    while True:
+        start_pos = _find_aligned(data, start, 0)
+        if start_pos == -1:
+            # the start sequence might be cut off
+            return frames, data[-(len(start) - 2):]
+
+        end_pos = _find_aligned(data, end, start_pos + len(start))
+        if end_pos == -1 or end_pos + len(end) + trailer_len > len(data):
+            if len(data) - start_pos > MAX_FRAME_LENGTH:
+                logger.warning("frame is too long, dropping it")
+                data = data[start_pos + len(start):]
+                continue
+            return frames, data[start_pos:]
+
+        frame_end = end_pos + len(end) + trailer_len
+        frames.append(data[start_pos:frame_end])
+        data = data[frame_end:]
+
+
+def _find_aligned(data: str, pattern: str, start: int) -> int:
+    """like str.find, but only finds the pattern at the start of a byte"""
+    pos = data.find(pattern, start)
+    while pos != -1 and pos % 2 == 1:
+        pos = data.find(pattern, pos + 1)
+    return pos
+
+
+def archive_frame(archive: frame_archive.FrameArchive, value: str, port: str):
+    """appends the hex frame value to archive, errors are only logged so that reading goes on"""
+    try:
+        archive.append(bytes.fromhex(value), port=port)
+    except (ValueError, OSError) as e:
+        logger.warning(f"could not archive frame from {port}: {e!r}")
+
+
+async def with_timeout(coro: typing.Awaitable, timeout: float):
+    """
+    Like asyncio.wait_for, which can swallow a cancellation before python 3.12 if the awaited
+    coroutine finishes at the same time. A reading task would then keep running forever.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if not done:
+        task.cancel()
+        raise asyncio.TimeoutError()
+    return task.result()
 
 
 async def _read_from_port_once(reader: asyncio.StreamReader, wait_time) -> str:
@@ -116,8 +179,11 @@ async def _read_from_port_once(reader: asyncio.StreamReader, wait_time) -> str:
         await asyncio.sleep(WAIT_TIME)
 
 
-async def read(queue: asyncio.Queue):
-    """Asynchronously reads data from the queue and tries to read them into an SmlFile"""
+async def read(queue: asyncio.Queue, cache: typing.Optional[parse_cache.ParseCache] = None):
+    """
+    Asynchronously reads data from the queue and tries to read them into an SmlFile.
+    If a cache is given, frames which were received before are not parsed again
+    """
     while True:
         item = await queue.get()
         if item is None:
@@ -127,11 +193,12 @@ async def read(queue: asyncio.Queue):
         else:
             logger.trace(item)
 
-            reader = sml_reader.SmlReader(item)
+            reader = sml_reader.SmlReader(item, cache)
 
             result = reader.read_sml_file()
 
-            logger.trace(result.dump_to_json())
+            # lazy, otherwise every file is dumped to json even if trace logging is off
+            logger.opt(lazy=True).trace("{}", result.dump_to_json)
 
             yield result
 
@@ -160,16 +227,194 @@ async def read_one(default_portsettings: PortSettings) -> sml_reader.SmlFile:
     return result
 
 
-async def main(port_settings: PortSettings) -> typing.AsyncIterator[sml_reader.SmlFile]:
+class MeterConnection:
+    """
+    Keeps the port open and parses every received frame in the background, so read_one returns the
+    most recent SmlFile at once instead of opening the port and waiting for the next frame.
+    The port is closed after idle_timeout seconds without a call to read_one and reopened on the next one.
+    With a cache, the frames of an idle meter are not parsed again.
+    """
+
+    def __init__(
+        self,
+        port_settings: PortSettings,
+        idle_timeout: float = IDLE_TIMEOUT,
+        archive: typing.Optional[frame_archive.FrameArchive] = None,
+        cache: typing.Optional[parse_cache.ParseCache] = None,
+    ):
+        self.port_settings = port_settings
+        self.idle_timeout = idle_timeout
+        self.archive = archive
+        self.cache = cache
+        self._writer: typing.Optional[asyncio.StreamWriter] = None
+        self._tasks: typing.List[asyncio.Task] = []
+        self._latest: typing.Optional[sml_reader.SmlFile] = None
+        self._next_file: typing.Optional[asyncio.Event] = None
+        self._error: typing.Optional[BaseException] = None
+        self._last_used = 0.0
+        self._open_lock: typing.Optional[asyncio.Lock] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def open(self):
+        # created here, so that it belongs to the running event loop
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+
+        # concurrent callers must not open the port more than once
+        async with self._open_lock:
+            if self.is_open:
+                return
+
+            reader, self._writer = await serial_asyncio.open_serial_connection(
+                url=self.port_settings.port,
+                baudrate=self.port_settings.baudrate,
+                bytesize=self.port_settings.bytesize,
+                parity=self.port_settings.parity,
+                stopbits=self.port_settings.stopbits,
+            )
+            self._error = None
+            self._next_file = asyncio.Event()
+            self._last_used = asyncio.get_event_loop().time()
+
+            self._tasks = [
+                asyncio.create_task(self._receive(reader)),
+                asyncio.create_task(self._close_when_idle()),
+            ]
+            logger.debug(f"opened {self.port_settings.port}")
+
+    async def read_one(
+        self, timeout: float = None, wait_for_next: bool = False
+    ) -> sml_reader.SmlFile:
+        """
+        Returns the most recent SmlFile. If there is none yet or wait_for_next is set, waits up to timeout
+        seconds for the next one
+        """
+        await self.open()
+        self._last_used = asyncio.get_event_loop().time()
+
+        if self._latest is not None and not wait_for_next:
+            return self._latest
+
+        await asyncio.wait_for(self._next_file.wait(), timeout)
+        if self._error is not None:
+            raise self._error
+        return self._latest
+
+    def close(self):
+        if not self.is_open:
+            return
+
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+        self._writer.close()  # we need to do this, otherwise we leak file handles
+        self._writer = None
+        self._latest = None
+        if self._error is None:
+            self._error = ConnectionError(f"{self.port_settings.port} was closed")
+        self._next_file.set()  # wake up everyone waiting, they get the error
+        logger.debug(f"closed {self.port_settings.port}")
+
+    async def _receive(self, reader: asyncio.StreamReader):
+        port = self.port_settings.port
+        data = ""
+        try:
+            while True:
+                msg = await reader.read(READ_SIZE)
+                if not msg:
+                    raise ConnectionError(f"{port} was closed by the device")
+
+                frames, data = split_frames(data + msg.hex())
+                if self.archive is not None:
+                    for frame in frames:
+                        archive_frame(self.archive, frame, port)
+                if frames:
+                    # frames received at once are outdated except for the newest one
+                    self._parse(frames[-1])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"reading from {port} failed: {e!r}")
+            self._error = e
+            self.close()
+
+    def _parse(self, frame: str):
+        try:
+            result = sml_reader.SmlReader(frame, self.cache).read_sml_file()
+        except Exception as e:
+            logger.warning(f"could not parse message from {self.port_settings.port}: {e!r}")
+            return
+
+        self._latest = result
+        next_file, self._next_file = self._next_file, asyncio.Event()
+        next_file.set()
+
+    async def _close_when_idle(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            idle = loop.time() - self._last_used
+            if idle >= self.idle_timeout:
+                logger.debug(f"{self.port_settings.port} was idle for {idle:.0f}s")
+                self.close()
+                return
+            await asyncio.sleep(self.idle_timeout - idle)
+
+
+class ConnectionPool:
+    """
+    Keeps one MeterConnection per port, e.g. for a poller reading several meters every few seconds.
+    The connections share the cache
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = IDLE_TIMEOUT,
+        cache: typing.Optional[parse_cache.ParseCache] = None,
+    ):
+        self.idle_timeout = idle_timeout
+        self.cache = cache
+        self._connections: typing.Dict[str, MeterConnection] = {}
+
+    def get(self, port_settings: PortSettings) -> MeterConnection:
+        connection = self._connections.get(port_settings.port)
+        if connection is None:
+            connection = MeterConnection(port_settings, self.idle_timeout, cache=self.cache)
+            self._connections[port_settings.port] = connection
+        return connection
+
+    async def read_one(
+        self,
+        port_settings: PortSettings,
+        timeout: float = None,
+        wait_for_next: bool = False,
+    ) -> sml_reader.SmlFile:
+        return await self.get(port_settings).read_one(timeout, wait_for_next)
+
+    def close(self):
+        for connection in self._connections.values():
+            connection.close()
+        self._connections = {}
+
+
+async def main(
+        port_settings: PortSettings,
+        archive: typing.Optional[frame_archive.FrameArchive] = None,
+        cache: typing.Optional[parse_cache.ParseCache] = None,
+) -> typing.AsyncIterator[sml_reader.SmlFile]:
     """
     Example main which dumps the received file as json to the console. This runs for an infinite time, quit with CTRL+C
+    If an archive is given, every received frame is appended to it. If a cache is given, it is passed to read.
     """
 
     queue = asyncio.Queue()
-    receiver = await receive(port_settings, queue)
+    receiver = await receive(port_settings, queue, archive)
     asyncio.create_task(receiver)
 
-    reader = read(queue)
+    reader = read(queue, cache)
     async for sml_file in reader:
         yield sml_file
 
@@ -0,0 +1,127 @@
+"""
+A filter which only passes on values which changed noticeably, to cut down the number of writes to a
+database or MQTT broker. Meters send their full val list every few seconds, but most values rarely change:
+
+    deadband_filter = DeadbandFilter(
+        default=Deadband(relative=0.01, heartbeat=900),
+        series={"1-0:1.8.*": Deadband(absolute=10)},
+    )
+    async for change in changes(data_reader.main(port_settings), deadband_filter):
+        print(change)
+
+A value is emitted if it differs from the last emitted value of its (server id, obis code) by more than
+the deadband, or if the heartbeat interval passed since it was emitted last.
+"""
+
+import dataclasses
+import time
+import typing
+
+from smlpy import obis, sml_reader
+
+
+@dataclasses.dataclass()
+class Deadband:
+    absolute: float = 0  # minimum change of the scaled value
+    relative: float = 0  # minimum change relative to the last emitted value, e.g. 0.01 for 1%
+    heartbeat: typing.Optional[float] = None  # emit at least every heartbeat seconds
+
+    def exceeded(self, last: float, value: float) -> bool:
+        threshold = max(self.absolute, self.relative * abs(last))
+        return abs(value - last) > threshold
+
+
+class ChangeRecord(typing.NamedTuple):
+    server_id: bytes
+    obis_code: obis.ObisCode
+    timestamp: float  # seconds since the epoch
+    value: float  # already scaled
+    unit: str
+
+
+class _LastEmitted(typing.NamedTuple):
+    timestamp: float
+    value: float
+
+
+class DeadbandFilter:
+    """
+    Keeps the last emitted value of every series. series maps obis codes or patterns like 1-0:1.8.* to
+    their deadband, the first match wins. All other series use default
+    """
+
+    def __init__(
+        self,
+        default: Deadband = None,
+        series: typing.Mapping[
+            typing.Union[str, obis.ObisCode, obis.ObisPattern], Deadband
+        ] = None,
+    ):
+        self.default = default if default is not None else Deadband()
+        self._patterns: typing.List[
+            typing.Tuple[typing.Union[obis.ObisCode, obis.ObisPattern], Deadband]
+        ] = []
+        for key, deadband in (series or {}).items():
+            if isinstance(key, str):
+                key = obis.ObisPattern.from_str(key)
+            self._patterns.append((key, deadband))
+
+        self._deadbands: typing.Dict[obis.ObisCode, Deadband] = {}
+        self._last: typing.Dict[typing.Tuple[bytes, obis.ObisCode], _LastEmitted] = {}
+
+    def get_deadband(self, obis_code: obis.ObisCode) -> Deadband:
+        deadband = self._deadbands.get(obis_code)
+        if deadband is None:
+            deadband = next(
+                (x for pattern, x in self._patterns if obis_code.matches(pattern)),
+                self.default,
+            )
+            self._deadbands[obis_code] = deadband
+        return deadband
+
+    def process(
+        self, sml_file: sml_reader.SmlFile, timestamp: float = None
+    ) -> typing.List[ChangeRecord]:
+        """returns a record for every value of sml_file which has to be emitted"""
+        if timestamp is None:
+            timestamp = time.time()
+
+        records = []
+        for server_id, entry, value in sml_file.get_numeric_values():
+            server_id = sml_reader.server_id_to_bytes(server_id)
+            if self.update(server_id, entry.obj_name, value, timestamp):
+                records.append(
+                    ChangeRecord(server_id, entry.obj_name, timestamp, value, entry.unit)
+                )
+        return records
+
+    def update(
+        self, server_id: bytes, obis_code: obis.ObisCode, value: float, timestamp: float
+    ) -> bool:
+        """returns whether value has to be emitted, if so it becomes the last emitted value"""
+        key = (server_id, obis_code)
+        last = self._last.get(key)
+        if last is not None:
+            deadband = self.get_deadband(obis_code)
+            heartbeat_due = (
+                deadband.heartbeat is not None
+                and timestamp - last.timestamp >= deadband.heartbeat
+            )
+            if not heartbeat_due and not deadband.exceeded(last.value, value):
+                return False
+
+        self._last[key] = _LastEmitted(timestamp, value)
+        return True
+
+    def reset(self):
+        """forgets all emitted values, so the next value of every series is emitted"""
+        self._last = {}
+
+
+async def changes(
+    sml_files: typing.AsyncIterator[sml_reader.SmlFile], deadband_filter: DeadbandFilter
+) -> typing.AsyncIterator[ChangeRecord]:
+    """yields a ChangeRecord for every value which left its deadband, the sml files themselves are consumed"""
+    async for sml_file in sml_files:
+        for record in deadband_filter.process(sml_file):
+            yield record
@@ -0,0 +1,183 @@
+"""
+Functions to read sml files from a capture file, e.g. a raw dump of /dev/ttyUSB0 or a .hex file
+containing the hex representation of such a dump.
+The capture is memory-mapped and the frames are located with buffer searches, so captures of
+arbitrary size can be processed with constant memory:
+
+    for frame in iter_sml_files("capture.bin"):
+        print(frame.offset, frame.sml_file.dump_to_json())
+
+To resume later on, pass the end of the last frame you processed as offset.
+"""
+
+import dataclasses
+import mmap
+import pathlib
+import string
+import typing
+
+from loguru import logger
+
+from smlpy import parse_cache, sml_reader
+
+# the end sequence is followed by the number of padding bytes and the crc16
+_TRAILER_LEN = 3
+
+# number of bytes inspected to decide whether a capture contains hex or binary data
+_SNIFF_LEN = 64
+
+_hex_chars = frozenset((string.hexdigits + string.whitespace).encode("ascii"))
+
+
+@dataclasses.dataclass()
+class CapturedSmlFile:
+    offset: int  # position of the start sequence in the capture file
+    end: int  # position directly after the frame, use this as offset to resume
+    index: int  # number of the frame, counted from the offset the iteration started at
+    sml_file: sml_reader.SmlFile
+
+
+@dataclasses.dataclass()
+class _Patterns:
+    start: bytes
+    end: bytes
+    trailer_len: int
+    is_hex: bool
+
+
+_binary_patterns = _Patterns(
+    start=bytes.fromhex(sml_reader.msg_start + sml_reader.msg_version_1),
+    end=bytes.fromhex(sml_reader.msg_end + "1a"),
+    trailer_len=_TRAILER_LEN,
+    is_hex=False,
+)
+
+_hex_patterns = _Patterns(
+    start=(sml_reader.msg_start + sml_reader.msg_version_1).encode("ascii"),
+    end=(sml_reader.msg_end + "1a").encode("ascii"),
+    trailer_len=_TRAILER_LEN * 2,
+    is_hex=True,
+)
+
+_upper_hex_patterns = dataclasses.replace(
+    _hex_patterns, start=_hex_patterns.start.upper(), end=_hex_patterns.end.upper()
+)
+
+
+def iter_sml_files(
+    path: typing.Union[str, pathlib.Path],
+    offset: int = 0,
+    index: int = 0,
+    is_hex: typing.Optional[bool] = None,
+    strict: bool = False,
+    cache: typing.Optional[parse_cache.ParseCache] = None,
+) -> typing.Iterator[CapturedSmlFile]:
+    """
+    Lazily yields every sml file contained in the capture at path, together with its position.
+    offset is the byte position the search starts at, index the number of frames to skip after that.
+    is_hex tells whether the capture contains hex text instead of raw bytes, if it is None this is
+    guessed from the start of the file. Hex captures may contain line breaks, but not inside the
+    start and end sequences of a frame.
+    Frames which cannot be parsed are logged and skipped, unless strict is set.
+    With a cache, repeated frames are only parsed once.
+    """
+    path = pathlib.Path(path)
+
+    with path.open("rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            logger.debug(f"{path} is empty")
+            return
+
+        try:
+            if hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+
+            if is_hex is None:
+                is_hex = _looks_like_hex(mm)
+            patterns = _get_patterns(mm, is_hex)
+
+            count = 0
+            for start, end in _iter_frame_bounds(mm, patterns, offset):
+                if count < index:
+                    count += 1
+                    continue
+
+                sml_file = _parse_frame(mm, start, end, patterns, strict, cache)
+                if sml_file is not None:
+                    yield CapturedSmlFile(
+                        offset=start, end=end, index=count, sml_file=sml_file
+                    )
+                count += 1
+        finally:
+            mm.close()
+
+
+def _looks_like_hex(mm: mmap.mmap) -> bool:
+    head = mm[:_SNIFF_LEN]
+    return all(x in _hex_chars for x in head)
+
+
+def _get_patterns(mm: mmap.mmap, is_hex: bool) -> _Patterns:
+    if not is_hex:
+        return _binary_patterns
+
+    # searching for both cases would scan the whole capture for every frame, so decide once
+    head = mm[:_SNIFF_LEN]
+    if any(x in b"ABCDEF" for x in head):
+        return _upper_hex_patterns
+    return _hex_patterns
+
+
+def _iter_frame_bounds(
+    mm: mmap.mmap, patterns: _Patterns, offset: int
+) -> typing.Iterator[typing.Tuple[int, int]]:
+    start_len = len(patterns.start)
+    end_len = len(patterns.end)
+
+    pos = offset
+    while True:
+        start = mm.find(patterns.start, pos)
+        if start == -1:
+            return
+
+        end_pos = mm.find(patterns.end, start + start_len)
+        if end_pos == -1:
+            logger.debug(f"frame at {start} is truncated")
+            return
+
+        next_start = mm.find(patterns.start, start + start_len, end_pos)
+        if next_start != -1:
+            logger.warning(f"frame at {start} has no end sequence, skipping it")
+            pos = next_start
+            continue
+
+        end = end_pos + end_len + patterns.trailer_len
+        if end > len(mm):
+            logger.debug(f"frame at {start} is truncated")
+            return
+
+        yield start, end
+        pos = end
+
+
+def _parse_frame(
+    mm: mmap.mmap,
+    start: int,
+    end: int,
+    patterns: _Patterns,
+    strict: bool,
+    cache: typing.Optional[parse_cache.ParseCache],
+) -> typing.Optional[sml_reader.SmlFile]:
+    try:
+        if patterns.is_hex:
+            data = "".join(mm[start:end].decode("ascii").split())
+        else:
+            data = mm[start:end].hex()
+        return sml_reader.SmlReader(data, cache).read_sml_file()
+    except Exception as e:
+        if strict:
+            raise
+        logger.warning(f"could not parse frame at {start}: {e!r}")
+        return None
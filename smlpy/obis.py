@@ -0,0 +1,164 @@
+"""
+OBIS identifiers as sent in the obj_name of a val list entry, e.g. 1-0:1.8.0*255.
+An ObisCode is backed by the packed 6 raw bytes, so comparing and hashing is cheap. The text form
+A-B.C.D.E (with *F appended if F is not 255) is only built when it is needed.
+"""
+
+import functools
+import re
+import typing
+
+_GROUPS = 6
+_WILDCARDS = {"*", "a", "b", "c", "d", "e", "f"}
+_group = r"(\d+|\*|[a-fA-F])"
+_obis_regex = re.compile(
+    rf"^{_group}-{_group}[.:]{_group}\.{_group}\.{_group}(?:\*{_group})?$"
+)
+
+
+def _parse_groups(text: str) -> typing.List[typing.Optional[int]]:
+    """returns the six groups of text, None marks a wildcard. A missing F group defaults to 255"""
+    match = _obis_regex.match(text.strip())
+    if match is None:
+        raise ValueError(f"'{text}' is not an obis code in the form A-B:C.D.E*F")
+
+    groups = []
+    for group in match.groups():
+        if group is None:
+            groups.append(255)
+        elif group.lower() in _WILDCARDS:
+            groups.append(None)
+        else:
+            value = int(group)
+            if not 0 <= value <= 255:
+                raise ValueError(f"'{text}' contains a group larger than 255")
+            groups.append(value)
+    return groups
+
+
+def _pack(groups: typing.Iterable[int]) -> int:
+    packed = 0
+    for group in groups:
+        packed = (packed << 8) | group
+    return packed
+
+
+class ObisCode:
+    """An immutable OBIS identifier, A-B:C.D.E*F"""
+
+    __slots__ = ("_packed",)
+
+    def __init__(self, a: int, b: int, c: int, d: int, e: int, f: int = 255):
+        groups = (a, b, c, d, e, f)
+        if not all(0 <= x <= 255 for x in groups):
+            raise ValueError(f"all groups of an obis code must be bytes: {groups}")
+        object.__setattr__(self, "_packed", _pack(groups))
+
+    @classmethod
+    def from_int(cls, packed: int) -> "ObisCode":
+        if not 0 <= packed < 1 << (8 * _GROUPS):
+            raise ValueError(f"{packed} does not fit into 6 bytes")
+        code = cls.__new__(cls)
+        object.__setattr__(code, "_packed", packed)
+        return code
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ObisCode":
+        if len(data) != _GROUPS:
+            raise ValueError(f"an obis code has 6 bytes, not {len(data)}")
+        return cls.from_int(int.from_bytes(data, "big"))
+
+    @classmethod
+    def from_hex(cls, data: str) -> "ObisCode":
+        return cls.from_bytes(bytes.fromhex(data))
+
+    @classmethod
+    def from_str(cls, text: str) -> "ObisCode":
+        """parses 1-0:1.8.0*255, 1-0:1.8.0 or 1-0.1.8.0"""
+        groups = _parse_groups(text)
+        if None in groups:
+            raise ValueError(f"'{text}' contains wildcards, use ObisPattern instead")
+        return cls(*groups)
+
+    @property
+    def packed(self) -> int:
+        return self._packed
+
+    @property
+    def groups(self) -> typing.Tuple[int, int, int, int, int, int]:
+        return tuple(self._packed.to_bytes(_GROUPS, "big"))
+
+    def to_bytes(self) -> bytes:
+        return self._packed.to_bytes(_GROUPS, "big")
+
+    def matches(self, pattern: typing.Union[str, "ObisPattern", "ObisCode"]) -> bool:
+        """pattern is either an ObisCode or a text with wildcards, e.g. 1-*:1.8.*"""
+        if isinstance(pattern, ObisCode):
+            return pattern._packed == self._packed
+        if isinstance(pattern, str):
+            pattern = ObisPattern.from_str(pattern)
+        return pattern.matches(self)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("ObisCode is immutable")
+
+    def __eq__(self, other):
+        """a text like 1-0:1.8.0 is equal as well, but it has another hash, so it cannot be used as a dict key"""
+        if isinstance(other, ObisCode):
+            return self._packed == other._packed
+        if isinstance(other, str):
+            try:
+                return self._packed == ObisCode.from_str(other)._packed
+            except ValueError:
+                return False
+        return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, ObisCode):
+            return self._packed < other._packed
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self._packed)
+
+    def __reduce__(self):
+        return ObisCode.from_int, (self._packed,)
+
+    def __str__(self):
+        a, b, c, d, e, f = self.groups
+        text = f"{a}-{b}.{c}.{d}.{e}"
+        if f != 255:
+            text += f"*{f}"
+        return text
+
+    def __repr__(self):
+        return f"ObisCode('{self}')"
+
+
+class ObisPattern:
+    """An OBIS identifier in which some groups are wildcards, e.g. 1-*:1.8.*"""
+
+    __slots__ = ("_mask", "_value", "_text")
+
+    def __init__(self, groups: typing.Sequence[typing.Optional[int]], text: str = ""):
+        if len(groups) != _GROUPS:
+            raise ValueError(f"an obis pattern has 6 groups, not {len(groups)}")
+        self._mask = _pack(0 if x is None else 255 for x in groups)
+        self._value = _pack(0 if x is None else x for x in groups)
+        self._text = text
+
+    @classmethod
+    def from_str(cls, text: str) -> "ObisPattern":
+        """* or one of the placeholders a-f marks a wildcard. A missing F group means 255"""
+        return _compile_pattern(text)
+
+    def matches(self, code: ObisCode) -> bool:
+        return code.packed & self._mask == self._value
+
+    def __repr__(self):
+        return f"ObisPattern('{self._text}')"
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_pattern(text: str) -> ObisPattern:
+    return ObisPattern(_parse_groups(text), text)
@@ -0,0 +1,96 @@
+"""
+A bounded LRU cache of parse results, keyed by a digest of the hex data of a frame or message body.
+Idle meters and replayed archives send many identical frames, and SML_PublicOpen.Res and
+SML_PublicClose.Res messages often only differ in their transaction id. With a cache, these only cost
+a hash computation instead of a full parse:
+
+    cache = ParseCache()
+    async for sml_file in data_reader.read(queue, cache=cache):
+        ...
+    print(cache.stats())
+
+The cached results are shared between all frames with the same content, so they must not be modified.
+Times sent as elapsed seconds are converted to a datetime when they are parsed first.
+"""
+
+import collections
+import hashlib
+import typing
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+# a parse result takes about this many bytes per hex char of its data
+_BYTES_PER_HEX_CHAR = 6
+_ENTRY_OVERHEAD = 200
+_DIGEST_SIZE = 16
+
+
+class CacheStats(typing.NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    size: int  # estimated size of the cached results in bytes
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ParseCache:
+    """max_bytes caps the estimated memory used by the cached results"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "collections.OrderedDict[bytes, typing.Tuple[typing.Any, int]]" = (
+            collections.OrderedDict()
+        )
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def digest(data: str) -> bytes:
+        return hashlib.blake2b(data.encode("ascii"), digest_size=_DIGEST_SIZE).digest()
+
+    def get(self, key: bytes) -> typing.Optional[typing.Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: bytes, value: typing.Any, data_len: int):
+        """data_len is the length of the hex data value was parsed from, it is used to estimate its size"""
+        cost = data_len * _BYTES_PER_HEX_CHAR + _ENTRY_OVERHEAD
+        if cost > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= old[1]
+        self._entries[key] = (value, cost)
+        self._size += cost
+
+        while self._size > self.max_bytes:
+            _, (_, evicted_cost) = self._entries.popitem(last=False)
+            self._size -= evicted_cost
+            self._evictions += 1
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            entries=len(self._entries),
+            size=self._size,
+        )
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
@@ -0,0 +1,393 @@
+"""
+A server which pushes live readings to dashboards and home automation clients, so that they do not need
+their own connection to the meter. Every sml file is parsed once, each reading is encoded once and the
+same bytes are sent to every subscriber:
+
+    server = PushServer()
+    await server.serve(port=8765)  # newline delimited json over plain tcp
+    await server.serve_websocket(port=8766)
+    async for sml_file in push(data_reader.main(port_settings), server):
+        ...
+
+Each reading is sent as one json object, a line of its own or a websocket text message:
+
+    {"server_id": "0901454d4800007514c4", "obis": "1-0.1.8.0", "value": 33547.0, "unit": "Wh", "timestamp": 1603122000.0}
+
+New subscribers first receive the latest value of every series. They can send a json object like
+{"obis": ["1-0:1.8.0", "1-0:16.7.*"]} at any time to only receive matching obis codes, {"obis": null}
+receives everything again.
+Every subscriber has a bounded buffer with one entry per series. If a subscriber is slow, a newer value
+replaces the buffered value of its series and the oldest series is dropped if the buffer is full, so
+a slow subscriber never delays the parse loop or the other subscribers. A subscriber which does not
+accept any data for send_timeout seconds is disconnected.
+"""
+
+import asyncio
+import base64
+import collections
+import hashlib
+import json
+import struct
+import time
+import typing
+
+from loguru import logger
+
+from smlpy import data_reader, obis, sml_reader
+
+MAX_PENDING = 256  # series buffered per subscriber
+SEND_TIMEOUT = 30
+MAX_MESSAGE_SIZE = 64 * 1024  # of messages sent by subscribers
+BACKLOG = 1024  # many dashboards reconnect at once after a restart
+
+_WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_OP_TEXT = 0x1
+_OP_CLOSE = 0x8
+_OP_PING = 0x9
+_OP_PONG = 0xA
+
+_SeriesKey = typing.Tuple[bytes, obis.ObisCode]
+_Filter = typing.Union[obis.ObisCode, obis.ObisPattern]
+
+
+class _EncodedReading:
+    """a reading encoded once for all subscribers"""
+
+    __slots__ = ("obis_code", "line", "_frame")
+
+    def __init__(self, obis_code: typing.Optional[obis.ObisCode], line: bytes):
+        self.obis_code = obis_code
+        self.line = line
+        self._frame: typing.Optional[bytes] = None
+
+    @property
+    def frame(self) -> bytes:
+        if self._frame is None:
+            self._frame = _websocket_frame(_OP_TEXT, self.line.rstrip(b"\n"))
+        return self._frame
+
+
+class _Subscriber:
+    def __init__(
+        self,
+        name: str,
+        writer: asyncio.StreamWriter,
+        encode: typing.Callable[[_EncodedReading], bytes],
+        max_pending: int,
+    ):
+        self.name = name
+        self.writer = writer
+        self.encode = encode
+        self.max_pending = max_pending
+        self.filters: typing.Optional[typing.List[_Filter]] = None
+        self.dropped = 0
+        self._matches: typing.Dict[obis.ObisCode, bool] = {}
+        self._pending: "collections.OrderedDict[_SeriesKey, _EncodedReading]" = (
+            collections.OrderedDict()
+        )
+        self._ready = asyncio.Event()
+
+    def set_filters(self, filters: typing.Optional[typing.List[_Filter]]):
+        self.filters = filters
+        self._matches = {}
+        self._pending.clear()
+
+    def offer(self, key: _SeriesKey, reading: _EncodedReading):
+        """buffers reading without ever blocking, the latest value of a series wins"""
+        if not self._wants(reading.obis_code):
+            return
+
+        if key not in self._pending and len(self._pending) >= self.max_pending:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+        self._pending[key] = reading
+        self._ready.set()
+
+    def _wants(self, obis_code: obis.ObisCode) -> bool:
+        if self.filters is None:
+            return True
+        wanted = self._matches.get(obis_code)
+        if wanted is None:
+            wanted = any(obis_code.matches(x) for x in self.filters)
+            self._matches[obis_code] = wanted
+        return wanted
+
+    async def send_pending(self, send_timeout: float):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            if not self._pending:
+                continue
+
+            data = b"".join(self.encode(x) for x in self._pending.values())
+            self._pending.clear()
+            self.writer.write(data)
+            await data_reader.with_timeout(self.writer.drain(), send_timeout)
+
+
+class PushServer:
+    """
+    Fans the readings of every published sml file out to all subscribers of the started servers.
+    max_pending is the number of series buffered per subscriber
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING, send_timeout: float = SEND_TIMEOUT):
+        self.max_pending = max_pending
+        self.send_timeout = send_timeout
+        self._subscribers: typing.Set[_Subscriber] = set()
+        self._latest: typing.Dict[_SeriesKey, _EncodedReading] = {}
+        self._servers: typing.List[asyncio.AbstractServer] = []
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        """
+        Starts a server which sends newline delimited json.
+        Use server.sockets[0].getsockname() to find out the port.
+        """
+        server = await asyncio.start_server(
+            self._handle_ndjson, host, port, backlog=BACKLOG
+        )
+        self._servers.append(server)
+        return server
+
+    async def serve_websocket(
+        self, host: str = "127.0.0.1", port: int = 0
+    ) -> asyncio.AbstractServer:
+        """Starts a server which sends every reading as a websocket text message, on any path"""
+        server = await asyncio.start_server(
+            self._handle_websocket, host, port, backlog=BACKLOG
+        )
+        self._servers.append(server)
+        return server
+
+    def publish(self, sml_file: sml_reader.SmlFile, timestamp: float = None) -> int:
+        """hands every numeric value of sml_file to the subscribers, returns the number of values"""
+        if timestamp is None:
+            timestamp = time.time()
+
+        count = 0
+        for server_id, entry, value in sml_file.get_numeric_values():
+            server_id = sml_reader.server_id_to_bytes(server_id)
+            self.update(server_id, entry.obj_name, value, entry.unit or "", timestamp)
+            count += 1
+        return count
+
+    def update(
+        self,
+        server_id: bytes,
+        obis_code: obis.ObisCode,
+        value: float,
+        unit: str,
+        timestamp: float,
+    ):
+        """encodes a reading and hands it to the subscribers, this never waits for them"""
+        line = json.dumps(
+            {
+                "server_id": server_id.hex(),
+                "obis": str(obis_code),
+                "value": value,
+                "unit": unit,
+                "timestamp": timestamp,
+            },
+            ensure_ascii=False,
+        )
+        reading = _EncodedReading(obis_code, line.encode("utf-8") + b"\n")
+        key = (server_id, obis_code)
+        self._latest[key] = reading
+        for subscriber in self._subscribers:
+            subscriber.offer(key, reading)
+
+    def close(self):
+        for server in self._servers:
+            server.close()
+        self._servers = []
+        for subscriber in self._subscribers:
+            subscriber.writer.close()
+
+    async def _handle_ndjson(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async def receive():
+            while True:
+                try:
+                    line = await reader.readuntil(b"\n")
+                except asyncio.IncompleteReadError:
+                    return
+                except asyncio.LimitOverrunError:
+                    logger.warning(f"{name} sent a too long line, disconnecting it")
+                    return
+                if line.strip():
+                    self._handle_message(subscriber, line)
+
+        name = _peer_name(writer)
+        subscriber = _Subscriber(name, writer, _encode_line, self.max_pending)
+        await self._run(subscriber, receive())
+
+    async def _handle_websocket(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        async def receive():
+            while True:
+                opcode, payload = await _read_websocket_frame(reader)
+                if opcode == _OP_CLOSE:
+                    writer.write(_websocket_frame(_OP_CLOSE, payload[:2]))
+                    return
+                if opcode == _OP_PING:
+                    writer.write(_websocket_frame(_OP_PONG, payload))
+                elif opcode == _OP_TEXT:
+                    self._handle_message(subscriber, payload)
+
+        name = _peer_name(writer)
+        try:
+            await _accept_websocket(reader, writer)
+        except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+            logger.debug(f"websocket handshake with {name} failed: {e!r}")
+            writer.close()
+            return
+
+        subscriber = _Subscriber(name, writer, _encode_frame, self.max_pending)
+        await self._run(subscriber, receive())
+
+    async def _run(self, subscriber: _Subscriber, receive: typing.Awaitable):
+        logger.debug(f"{subscriber.name} subscribed")
+        self._subscribers.add(subscriber)
+        self._send_latest(subscriber)
+
+        sending = asyncio.ensure_future(subscriber.send_pending(self.send_timeout))
+        receiving = asyncio.ensure_future(receive)
+        try:
+            done, _ = await asyncio.wait(
+                {sending, receiving}, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    logger.debug(f"{subscriber.name} disconnected: {task.exception()!r}")
+        finally:
+            self._subscribers.discard(subscriber)
+            sending.cancel()
+            receiving.cancel()
+            subscriber.writer.close()
+            if subscriber.dropped:
+                logger.info(f"dropped {subscriber.dropped} values for {subscriber.name}")
+            logger.debug(f"{subscriber.name} unsubscribed")
+
+    def _handle_message(self, subscriber: _Subscriber, message: bytes):
+        try:
+            filters = _parse_filters(message)
+        except ValueError as e:
+            error = json.dumps({"error": str(e)}).encode("utf-8") + b"\n"
+            subscriber.writer.write(subscriber.encode(_EncodedReading(None, error)))
+            return
+
+        subscriber.set_filters(filters)
+        self._send_latest(subscriber)
+
+    def _send_latest(self, subscriber: _Subscriber):
+        for key, reading in self._latest.items():
+            subscriber.offer(key, reading)
+
+
+def _parse_filters(message: bytes) -> typing.Optional[typing.List[_Filter]]:
+    try:
+        data = json.loads(message)
+    except ValueError:
+        raise ValueError("messages must be json objects like {\"obis\": [\"1-0:1.8.0\"]}")
+    if not isinstance(data, dict) or "obis" not in data:
+        raise ValueError("messages must contain the key obis")
+
+    codes = data["obis"]
+    if codes is None:
+        return None
+    if isinstance(codes, str):
+        codes = [codes]
+    if not isinstance(codes, list) or not all(isinstance(x, str) for x in codes):
+        raise ValueError("obis must be a list of obis codes or patterns")
+    return [obis.ObisPattern.from_str(x) for x in codes]
+
+
+def _encode_line(reading: _EncodedReading) -> bytes:
+    return reading.line
+
+
+def _encode_frame(reading: _EncodedReading) -> bytes:
+    return reading.frame
+
+
+def _peer_name(writer: asyncio.StreamWriter) -> str:
+    peer = writer.get_extra_info("peername")
+    return f"{peer[0]}:{peer[1]}" if peer else "unknown peer"
+
+
+async def _accept_websocket(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """answers the opening handshake of rfc 6455"""
+    request = await reader.readuntil(b"\r\n\r\n")
+    lines = request.decode("latin-1").split("\r\n")
+    if not lines[0].startswith("GET "):
+        raise ValueError(f"not a websocket request: {lines[0]!r}")
+
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    key = headers.get("sec-websocket-key")
+    if key is None or "websocket" not in headers.get("upgrade", "").lower():
+        writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+        raise ValueError("the request is no websocket upgrade")
+
+    accept = base64.b64encode(
+        hashlib.sha1((key + _WEBSOCKET_GUID).encode("ascii")).digest()
+    ).decode("ascii")
+    writer.write(
+        (
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode("ascii")
+    )
+    await writer.drain()
+
+
+async def _read_websocket_frame(reader: asyncio.StreamReader) -> typing.Tuple[int, bytes]:
+    """reads a frame sent by a client, fragmented messages are not supported"""
+    first, second = await reader.readexactly(2)
+    opcode = first & 0x0F
+    if not first & 0x80 or opcode == 0:
+        raise ValueError("fragmented websocket messages are not supported")
+    if not second & 0x80:
+        raise ValueError("websocket frames of clients must be masked")
+
+    length = second & 0x7F
+    if length == 126:
+        (length,) = struct.unpack(">H", await reader.readexactly(2))
+    elif length == 127:
+        (length,) = struct.unpack(">Q", await reader.readexactly(8))
+    if length > MAX_MESSAGE_SIZE:
+        raise ValueError(f"websocket message of {length} bytes is too large")
+
+    mask = await reader.readexactly(4)
+    payload = bytearray(await reader.readexactly(length))
+    for i in range(length):
+        payload[i] ^= mask[i % 4]
+    return opcode, bytes(payload)
+
+
+def _websocket_frame(opcode: int, payload: bytes) -> bytes:
+    length = len(payload)
+    if length < 126:
+        header = struct.pack(">BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def push(
+    sml_files: typing.AsyncIterator[sml_reader.SmlFile], server: PushServer
+) -> typing.AsyncIterator[sml_reader.SmlFile]:
+    """publishes every sml file to the subscribers of server and yields it, so that other stages can follow"""
+    async for sml_file in sml_files:
+        server.publish(sml_file)
+        yield sml_file
@@ -0,0 +1,259 @@
+"""
+A table in shared memory containing the latest value of each (meter, obis code), so that other
+local processes can read current values without parsing or IPC copies.
+Only the process which owns the serial port writes to the table:
+
+    table = SharedValueTable("smlpy-values")
+    async for sml_file in publish(data_reader.main(port_settings), table):
+        ...
+
+Other processes attach to it by name:
+
+    values = SharedValueReader("smlpy-values")
+    value = values.get(server_id, ObisCode(1, 0, 1, 8, 0))
+
+Every slot is protected by a seqlock: the writer increments the sequence number before and after
+updating a slot, readers retry until they saw an even sequence number which did not change while
+reading. multiprocessing.shared_memory requires python 3.8 or newer.
+"""
+
+import dataclasses
+import struct
+import time
+import typing
+
+from loguru import logger
+
+from smlpy import obis, sml_reader
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # python < 3.8
+    resource_tracker = None
+    shared_memory = None
+
+SERVER_ID_LEN = 16
+DEFAULT_CAPACITY = 256
+
+_MAGIC = b"SMLV"
+_VERSION = 1
+# magic, version, capacity, number of used slots
+_header = struct.Struct("<4sHxxII")
+_HEADER_SIZE = 64
+# sequence number, server id length, server id, obis code, scaled value, scaler, unit code, timestamp
+_slot = struct.Struct(f"<QB{SERVER_ID_LEN}sQdbxHd11x")
+_seq = struct.Struct("<Q")
+_count_offset = 12
+
+_MAX_READ_ATTEMPTS = 10000
+
+# names of the tables created by this process, see _attach
+_own_tables: typing.Set[str] = set()
+
+
+@dataclasses.dataclass()
+class SharedValue:
+    server_id: bytes
+    obis_code: obis.ObisCode
+    value: float  # already scaled
+    scaler: int
+    unit_code: int
+    timestamp: float  # seconds since the epoch
+
+    @property
+    def unit(self) -> str:
+        return sml_reader.get_unit(self.unit_code)
+
+
+def _require_shared_memory():
+    if shared_memory is None:
+        raise RuntimeError("shared values require multiprocessing.shared_memory (python >= 3.8)")
+
+
+def _slot_offset(index: int) -> int:
+    return _HEADER_SIZE + index * _slot.size
+
+
+class SharedValueTable:
+    """The writing side of the table. There must only be one writer per table"""
+
+    def __init__(self, name: str = None, capacity: int = DEFAULT_CAPACITY):
+        _require_shared_memory()
+        self._shm = shared_memory.SharedMemory(
+            name=name, create=True, size=_slot_offset(capacity)
+        )
+        _own_tables.add(self._shm.name)
+        self._buf = self._shm.buf
+        self._capacity = capacity
+        self._slots: typing.Dict[typing.Tuple[bytes, int], int] = {}
+        _header.pack_into(self._buf, 0, _MAGIC, _VERSION, capacity, 0)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def publish(self, sml_file: sml_reader.SmlFile, timestamp: float = None) -> int:
+        """writes every numeric val list entry of sml_file, returns the number of written values"""
+        if timestamp is None:
+            timestamp = time.time()
+
+        count = 0
+        for server_id, entry, value in sml_file.get_numeric_values():
+            if self.update(
+                server_id,
+                entry.obj_name,
+                value,
+                entry.scaler,
+                entry.unit_code or 0,
+                timestamp,
+            ):
+                count += 1
+        return count
+
+    def update(
+        self,
+        server_id: typing.Union[str, bytes, None],
+        obis_code: obis.ObisCode,
+        value: float,
+        scaler: int,
+        unit_code: int,
+        timestamp: float,
+    ) -> bool:
+        server_id = sml_reader.server_id_to_bytes(server_id)
+        if len(server_id) > SERVER_ID_LEN:
+            logger.warning(f"server id {server_id.hex()} is too long for the shared table")
+            return False
+
+        key = (server_id, obis_code.packed)
+        index = self._slots.get(key)
+        is_new = index is None
+        if is_new:
+            index = len(self._slots)
+            if index >= self._capacity:
+                logger.warning(f"shared table is full, dropping {obis_code}")
+                return False
+
+        offset = _slot_offset(index)
+        (seq,) = _seq.unpack_from(self._buf, offset)
+        _seq.pack_into(self._buf, offset, seq + 1)  # odd: a write is in progress
+        _slot.pack_into(
+            self._buf,
+            offset,
+            seq + 1,
+            len(server_id),
+            server_id,
+            obis_code.packed,
+            value,
+            scaler,
+            unit_code,
+            timestamp,
+        )
+        _seq.pack_into(self._buf, offset, seq + 2)
+
+        if is_new:
+            # only announce the slot after it was written completely
+            self._slots[key] = index
+            struct.pack_into("<I", self._buf, _count_offset, len(self._slots))
+        return True
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
+        _own_tables.discard(self._shm.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        self.unlink()
+
+
+class SharedValueReader:
+    """The reading side of the table, can be used by any number of processes"""
+
+    def __init__(self, name: str):
+        _require_shared_memory()
+        self._shm = _attach(name)
+        self._buf = self._shm.buf
+        magic, version, self._capacity, _ = _header.unpack_from(self._buf, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{name} is not a shared value table")
+        self._slots: typing.Dict[typing.Tuple[bytes, int], int] = {}
+
+    def get(
+        self, server_id: typing.Union[str, bytes, None], obis_code: obis.ObisCode
+    ) -> typing.Optional[SharedValue]:
+        key = (sml_reader.server_id_to_bytes(server_id), obis_code.packed)
+        index = self._slots.get(key)
+        if index is None:
+            self._refresh()
+            index = self._slots.get(key)
+            if index is None:
+                return None
+        return self._read_slot(index)
+
+    def read_all(self) -> typing.List[SharedValue]:
+        self._refresh()
+        return [self._read_slot(index) for index in range(len(self._slots))]
+
+    def _refresh(self):
+        (count,) = struct.unpack_from("<I", self._buf, _count_offset)
+        for index in range(len(self._slots), min(count, self._capacity)):
+            value = self._read_slot(index)
+            self._slots[(value.server_id, value.obis_code.packed)] = index
+
+    def _read_slot(self, index: int) -> SharedValue:
+        offset = _slot_offset(index)
+        for _ in range(_MAX_READ_ATTEMPTS):
+            data = _slot.unpack_from(self._buf, offset)
+            seq = data[0]
+            if seq % 2 == 1:
+                continue  # the writer is updating this slot
+            (seq_after,) = _seq.unpack_from(self._buf, offset)
+            if seq == seq_after:
+                break
+        else:
+            raise TimeoutError(f"could not get a consistent read of slot {index}")
+
+        _, server_id_len, server_id, packed, value, scaler, unit_code, timestamp = data
+        return SharedValue(
+            server_id=server_id[:server_id_len],
+            obis_code=obis.ObisCode.from_int(packed),
+            value=value,
+            scaler=scaler,
+            unit_code=unit_code,
+            timestamp=timestamp,
+        )
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _attach(name: str):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # python < 3.13 always tracks, which would unlink the table on exit
+        shm = shared_memory.SharedMemory(name=name)
+        if shm.name not in _own_tables:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+async def publish(
+    sml_files: typing.AsyncIterator[sml_reader.SmlFile], table: SharedValueTable
+) -> typing.AsyncIterator[sml_reader.SmlFile]:
+    """writes the values of every sml file to table before yielding the file, so other processes see them at once"""
+    async for sml_file in sml_files:
+        table.publish(sml_file)
+        yield sml_file
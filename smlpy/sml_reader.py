@@ -7,7 +7,7 @@ import jsons.decorators
 import yaml
 from loguru import logger
 
-from smlpy import errors, units
+from smlpy import errors, obis, parse_cache, units
 
 msg_start = "1b1b1b1b"
 msg_end = "1b1b1b1b"
@@ -18,7 +18,10 @@ DATA_MIN_LEN = len(msg_start) + len(msg_version_1) + len(msg_end) + 8  # crc len
 obis_path = pathlib.Path(__file__).parent / "obis_t_kennzahlen.yaml"
 
 with obis_path.open() as f:
-    obis_t_kennzahlen = yaml.safe_load(f)["kennzahlen"]
+    obis_t_kennzahlen = {
+        obis.ObisCode.from_str(key): value
+        for key, value in yaml.safe_load(f)["kennzahlen"].items()
+    }
 
 # from the type-length definition, first tuple is byte length, second is signed
 _integer_hex_marker = {
@@ -36,6 +39,12 @@ _integer_hex_marker = {
     "59": (8, True),
 }
 
+# type-length field of an octet string with 6 bytes
+_obis_hex_marker = "07"
+
+# smaller message bodies are parsed faster than they are looked up in the cache, in hex chars
+MIN_CACHED_BODY_LEN = 32
+
 
 class SmlMessageEnvelope:
     def __init__(self):
@@ -57,10 +66,11 @@ class SmlMessageBody:
 
 class SmlValListEntry(SmlMessageBody):
     def __init__(self):
-        self.obj_name = ""
+        self.obj_name: typing.Union[obis.ObisCode, str, None] = None
         self.status = None
         self.val_time = None
         self.unit = None
+        self.unit_code = None
         self.scaler = None
         self.value = None
         self.value_signature = None
@@ -133,9 +143,16 @@ class SmlTime:
         return f"{self.datetime}"
 
 
+def obis_code_serializer(obj: obis.ObisCode, **kwargs) -> str:
+    return str(obj)
+
+
 def sml_val_list_entry_serializer(obj: SmlValListEntry, **kwargs) -> typing.Dict:
     data = obj.__dict__.copy()
 
+    if isinstance(obj.obj_name, obis.ObisCode):
+        data["obj_name"] = str(obj.obj_name)
+
     try:
         data["scaled_value"] = obj.get_scaled_value()
     except errors.MissingValueInfoException:
@@ -155,15 +172,43 @@ class SmlFile:
     def __repr__(self):
         return f"SmlFile with {len(self.data)} entries"
 
+    def get_val_list_entries(
+        self,
+    ) -> typing.Iterator[typing.Tuple[typing.Optional[str], SmlValListEntry]]:
+        """yields every val list entry together with the server id of the SML_GetList.Res containing it"""
+        for message in self.data:
+            body = message.message_body
+            if isinstance(body, SmlGetListRes):
+                for entry in body.val_list or []:
+                    yield body.server_id, entry
+
+    def get_numeric_values(
+        self,
+    ) -> typing.Iterator[typing.Tuple[typing.Optional[str], SmlValListEntry, float]]:
+        """yields server id, entry and scaled value of every val list entry with an obis code and a numeric value"""
+        for server_id, entry in self.get_val_list_entries():
+            if not isinstance(entry.obj_name, obis.ObisCode) or not isinstance(
+                entry.value, int
+            ):
+                continue
+            try:
+                value = entry.get_scaled_value()
+            except errors.MissingValueInfoException:
+                continue
+            yield server_id, entry, value
+
     def dump_to_json(self):
         jsons.set_serializer(sml_val_list_entry_serializer, SmlValListEntry)
+        jsons.set_serializer(obis_code_serializer, obis.ObisCode)
         return jsons.dumps(self, jdkwargs={"indent": 2, "ensure_ascii": False})
 
 
 class SmlReader:
-    def __init__(self, data: str):
+    def __init__(self, data: str, cache: typing.Optional[parse_cache.ParseCache] = None):
+        """if a cache is given, results for frames and message bodies which were parsed before are reused"""
         self._data = data.lower().strip()
         self._pointer = 0
+        self._cache = cache
         self.sml_file = SmlFile()
 
         if len(data) < DATA_MIN_LEN:
@@ -198,6 +243,22 @@ class SmlReader:
         if self._pointer != 0:
             return
 
+        if self._cache is None:
+            return self._read_sml_file()
+
+        key = self._cache.digest(self._data)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self.sml_file = cached
+            self._pointer = len(self._data)
+            return cached
+
+        result = self._read_sml_file()
+        self._cache.put(key, result, len(self._data))
+        return result
+
+    def _read_sml_file(self):
+
         count = 0
         while True:
             count += 1
@@ -222,11 +283,22 @@ class SmlReader:
             if self._pointer == len(self._data):
                 return self.sml_file
 
-    def get_value_by_obis_id(self, obis_id: str):
+    def get_value_by_obis_id(
+        self, obis_id: typing.Union[str, obis.ObisCode, obis.ObisPattern]
+    ) -> typing.List[SmlValListEntry]:
         """searches for a val list entry which contains a obis number in the form 1-b:1.8.e
         you can replace b and e with an actual value or keep the placeholders in
         which case you get all matching messages
         """
+        if isinstance(obis_id, str):
+            obis_id = obis.ObisPattern.from_str(obis_id)
+
+        return [
+            entry
+            for _, entry in self.sml_file.get_val_list_entries()
+            if isinstance(entry.obj_name, obis.ObisCode)
+            and entry.obj_name.matches(obis_id)
+        ]
 
     def _read_message(self):
         message = SmlMessageEnvelope()
@@ -237,11 +309,59 @@ class SmlReader:
         message.transaction_id = self._handle_value_field()
         message.group_no = self._handle_value_field()
         message.abort_on_error = self._handle_value_field()
-        self._read_message_body(message)
+        if self._cache is None:
+            self._read_message_body(message)
+        else:
+            self._read_cached_message_body(message)
 
         message.crc_16 = self._handle_value_field()
         self._advance_and_compare("00")  # message end
 
+    def _read_cached_message_body(self, message):
+        start = self._pointer
+        end = self._skip_element(start)
+        if end - start < MIN_CACHED_BODY_LEN:
+            self._read_message_body(message)
+            return
+
+        key = self._cache.digest(self._data[start:end])
+        cached = self._cache.get(key)
+        if cached is not None:
+            message.message_body = cached
+            self._pointer = end
+            return
+
+        self._read_message_body(message)
+        if self._pointer == end:
+            self._cache.put(key, message.message_body, end - start)
+        else:
+            logger.debug(f"message body at {start} ends at {self._pointer}, expected {end}")
+
+    def _skip_element(self, pos: int) -> int:
+        """returns the position after the element at pos, without parsing it"""
+        tl = hex_to_int(self._data[pos : pos + 2])
+        more, element_type, length = tl & 0x80, tl & 0x70, tl & 0x0F
+        n_tl_bytes = 1
+        while more:
+            next_tl = hex_to_int(self._data[pos + 2 * n_tl_bytes : pos + 2 * n_tl_bytes + 2])
+            more = next_tl & 0x80
+            length = (length << 4) | (next_tl & 0x0F)
+            n_tl_bytes += 1
+
+        if element_type == 0x70:  # a list, length is the number of elements
+            pos += 2 * n_tl_bytes
+            for _ in range(length):
+                pos = self._skip_element(pos)
+            if pos > len(self._data):
+                raise errors.DataMissingException(pos, len(self._data))
+            return pos
+
+        # length contains the type-length field
+        end = pos + 2 * max(length, n_tl_bytes)
+        if end > len(self._data):
+            raise errors.DataMissingException(end, len(self._data))
+        return end
+
     def _assert_next_element_is_list_of_length(self, n: int):
         self._advance_and_compare("7")  # must be a list
         list_length = hex_to_int(self._advance(1))
@@ -311,7 +431,7 @@ class SmlReader:
             self._assert_next_element_is_list_of_length(7)
             inner_message.client_id = self._handle_value_field()
             inner_message.server_id = self._handle_value_field()
-            inner_message.list_name = self._handle_value_field()
+            inner_message.list_name = self._handle_obis_field()
             inner_message.act_sensor_time = self._handle_sml_time()
             inner_message.val_list = self._handle_val_list()
             inner_message.list_signature = (
@@ -397,17 +517,19 @@ class SmlReader:
             length = hex_to_int_byte(entry)
             data = self._advance(length - 2)
 
-        if data.lower().endswith("ff") and len(data) == 12:
-            # most likely a weird obis number
-            obis = self._hex_to_obis(data)
-            return obis
-        else:
-            value = octet_to_str(data)
-            return value
+        value = octet_to_str(data)
+        return value
 
-    def _hex_to_obis(self, data):
-        obis = f"{hex_to_int(data[0:2])}-{hex_to_int(data[2:4])}.{hex_to_int(data[4:6])}.{hex_to_int(data[6:8])}.{int(hex_to_int(data[8:]) / 255)}"
-        return obis
+    def _handle_obis_field(self) -> typing.Union[obis.ObisCode, str, None]:
+        """
+        obj_name and list_name are octet strings which contain the 6 bytes of an obis code.
+        Anything else is returned like any other value field
+        """
+        if self._peek(2) != _obis_hex_marker:
+            return self._handle_value_field()
+
+        self._advance(2)
+        return obis.ObisCode.from_hex(self._advance(12))
 
     def __repr__(self):
         if self._pointer > 10:
@@ -434,10 +556,11 @@ class SmlReader:
             logger.debug("processing list element {outer}", outer=outer)
 
             entry = SmlValListEntry()
-            entry.obj_name = self._handle_value_field()
+            entry.obj_name = self._handle_obis_field()
             entry.status = self._handle_status_field()
             entry.val_time = self._handle_value_field()
-            entry.unit = self._get_unit_field()
+            entry.unit_code = self._handle_value_field()
+            entry.unit = get_unit(entry.unit_code)
             entry.scaler = self._handle_value_field()
             entry.value = self._handle_value_field()
             entry.value_signature = self._handle_value_field()
@@ -446,10 +569,6 @@ class SmlReader:
 
         return values
 
-    def _get_unit_field(self):
-        field = self._handle_value_field()
-        return units.units.get(str(field), "no unit")
-
     def _expect_list(self):
         entry = self._advance(1)
         if entry != "7":
@@ -510,3 +629,21 @@ def leading_bit_set(hex: str):
 
 def octet_to_str(bytes: str) -> str:
     return "".join([chr(int(x, 16)) for x in chunks(bytes, 2)])
+
+
+def str_to_octet(value: str) -> bytes:
+    """reverses octet_to_str, e.g. to get the raw bytes of a server id"""
+    return value.encode("latin-1")
+
+
+def server_id_to_bytes(server_id: typing.Union[str, bytes, None]) -> bytes:
+    """the raw bytes of a server id as parsed into the message bodies, b"" if there is none"""
+    if not server_id:
+        return b""
+    if isinstance(server_id, str):
+        return str_to_octet(server_id)
+    return server_id
+
+
+def get_unit(unit_code: typing.Optional[int]) -> str:
+    return units.units.get(str(unit_code), "no unit")
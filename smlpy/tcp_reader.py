@@ -0,0 +1,207 @@
+"""
+Functions to read sml files from network IR readers which expose the raw byte stream of the meter on a
+TCP port, e.g. ser2net or Tasmota. The received frames go through the same queue and data_reader.read as
+the ones from a serial port, so one event loop can read hundreds of meters:
+
+    settings = [TcpSettings(host="192.168.1.20", port=8888), TcpSettings(host="192.168.1.21", port=8888)]
+    async for sml_file in main(settings):
+        print(sml_file.dump_to_json())
+
+Lost connections are reopened with a jittered exponential backoff.
+replay_server serves a capture over TCP, which is useful for tests and as a benchmark:
+python tcp_reader.py capture.bin 200
+"""
+
+import asyncio
+import dataclasses
+import random
+import sys
+import time
+import typing
+
+from loguru import logger
+
+from smlpy import archive as frame_archive
+from smlpy import data_reader, parse_cache, sml_reader
+
+READ_TIMEOUT = 30
+RECONNECT_MIN = 1
+RECONNECT_MAX = 60
+READ_SIZE = 64 * 1024
+QUEUE_SIZE = 1000  # frames waiting to be parsed, connections are paused if it is full
+
+
+@dataclasses.dataclass()
+class TcpSettings:
+    host: str
+    port: int
+    read_timeout: float = READ_TIMEOUT  # reconnect if nothing was received for this many seconds
+    reconnect_min: float = RECONNECT_MIN
+    reconnect_max: float = RECONNECT_MAX
+
+    @property
+    def name(self) -> str:
+        return f"{self.host}:{self.port}"
+
+
+async def receive(
+        settings: TcpSettings,
+        queue: asyncio.Queue,
+        archive: typing.Optional[frame_archive.FrameArchive] = None,
+):
+    """
+    Receives frames from the given host and puts them into the queue, like data_reader.receive.
+    The returned coroutine runs forever and reconnects whenever the connection is lost or times out.
+    """
+    return _read_from_connection(settings, queue, archive)
+
+
+async def _read_from_connection(
+        settings: TcpSettings,
+        queue: asyncio.Queue,
+        archive: typing.Optional[frame_archive.FrameArchive],
+        named: bool = False,
+):
+    """if named is set, (connection name, frame) tuples are put into the queue instead of the frames"""
+    attempt = 0
+    while True:
+        try:
+            reader, writer = await data_reader.with_timeout(
+                asyncio.open_connection(settings.host, settings.port),
+                settings.read_timeout,
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            logger.warning(f"could not connect to {settings.name}: {e!r}")
+        else:
+            logger.debug(f"connected to {settings.name}")
+            try:
+                async for frame in _read_frames(reader, settings):
+                    attempt = 0
+                    if archive is not None:
+                        data_reader.archive_frame(archive, frame, settings.name)
+                    await queue.put((settings.name, frame) if named else frame)
+            except (OSError, asyncio.TimeoutError) as e:
+                logger.warning(f"connection to {settings.name} lost: {e!r}")
+            finally:
+                writer.close()
+
+        await asyncio.sleep(_backoff(settings, attempt))
+        attempt += 1
+
+
+async def _read_frames(
+        reader: asyncio.StreamReader, settings: TcpSettings
+) -> typing.AsyncIterator[str]:
+    data = ""
+    while True:
+        msg = await data_reader.with_timeout(reader.read(READ_SIZE), settings.read_timeout)
+        if not msg:
+            raise ConnectionError("connection closed by the peer")
+
+        frames, data = data_reader.split_frames(data + msg.hex())
+        for frame in frames:
+            yield frame
+
+
+def _backoff(settings: TcpSettings, attempt: int) -> float:
+    """exponential backoff with jitter, so that many readers do not reconnect at the same time"""
+    delay = min(settings.reconnect_max, settings.reconnect_min * 2 ** min(attempt, 32))
+    return random.uniform(delay / 2, delay)
+
+
+async def main(
+        settings: typing.Iterable[TcpSettings],
+        archive: typing.Optional[frame_archive.FrameArchive] = None,
+        cache: typing.Optional[parse_cache.ParseCache] = None,
+) -> typing.AsyncIterator[sml_reader.SmlFile]:
+    """
+    Reads from all given hosts at once and yields every received SmlFile. This runs for an infinite time.
+    The hosts share the cache, so the same frame is parsed once even if several gateways forward it
+    """
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    tasks = [
+        asyncio.create_task(_read_from_connection(x, queue, archive, named=True))
+        for x in settings
+    ]
+    try:
+        async for sml_file in _read(queue, cache):
+            yield sml_file
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _read(
+        queue: asyncio.Queue, cache: typing.Optional[parse_cache.ParseCache] = None
+) -> typing.AsyncIterator[sml_reader.SmlFile]:
+    """like data_reader.read, but a frame which cannot be parsed only gets logged with its connection"""
+    while True:
+        name, frame = await queue.get()
+        try:
+            result = sml_reader.SmlReader(frame, cache).read_sml_file()
+        except Exception as e:
+            logger.warning(f"could not parse frame from {name}: {e!r}")
+            continue
+
+        logger.opt(lazy=True).trace("{}", result.dump_to_json)
+        yield result
+
+
+async def replay_server(
+        capture: bytes,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        interval: float = 0,
+        repeat: bool = True,
+) -> asyncio.AbstractServer:
+    """
+    Starts a server which sends capture to every client, e.g. the content of a raw capture file.
+    The capture is sent every interval seconds if repeat is set, otherwise the connection is closed after it.
+    Use server.sockets[0].getsockname() to find out the port.
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                writer.write(capture)
+                await writer.drain()
+                if not repeat:
+                    break
+                await asyncio.sleep(interval)
+        except (OSError, asyncio.CancelledError):
+            pass  # the client is gone or the server is shutting down
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def benchmark(capture: bytes, n_connections: int, duration: float = 10) -> float:
+    """Reads capture over n_connections local connections for duration seconds and returns the frames per second"""
+    server = await replay_server(capture)
+    port = server.sockets[0].getsockname()[1]
+    settings = [TcpSettings(host="127.0.0.1", port=port) for _ in range(n_connections)]
+
+    count = 0
+    results = main(settings)
+    start = time.monotonic()
+    try:
+        async for _ in results:
+            count += 1
+            if time.monotonic() - start >= duration:
+                break
+    finally:
+        await results.aclose()
+        server.close()
+
+    return count / (time.monotonic() - start)
+
+
+if __name__ == "__main__":
+    logger.remove()
+    capture_path = sys.argv[1]
+    connections = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    with open(capture_path, "rb") as f:
+        content = f.read()
+    fps = asyncio.run(benchmark(content, connections))
+    print(f"{fps:.0f} frames/s over {connections} connections")
@@ -0,0 +1,436 @@
+"""
+An append-only store for the values of val list entries, with one file per series (server id and obis code):
+
+    store = TimeSeriesStore("readings")
+    async for sml_file in record(data_reader.main(port_settings), store):
+        ...
+    timestamps, values = store.read_columns(server_id, ObisCode(1, 0, 1, 8, 0), start, end)
+
+Readings are buffered per series and written in blocks of block_size readings. Every block has a header
+with its time range, scaler and unit code, followed by two columns: the timestamps as delta-of-delta and
+the raw values as delta, both zigzag varint encoded with runs of zeros collapsed.
+A sidecar index with the time range and position of each block allows range queries without reading
+the whole file. Readings which are still buffered are lost if the process dies before flush or close.
+"""
+
+import bisect
+import dataclasses
+import itertools
+import pathlib
+import struct
+import time
+import typing
+
+from loguru import logger
+
+from smlpy import obis, sml_reader
+
+DEFAULT_BLOCK_SIZE = 4096
+
+_DATA_SUFFIX = ".smlts"
+_INDEX_SUFFIX = ".smlts.idx"
+_NO_SERVER_ID = "unknown"
+
+_BLOCK_MAGIC = b"SMTB"
+# magic, count, first timestamp, last timestamp, first value, scaler, unit code,
+# length of the timestamp column, length of the value column
+_block_header = struct.Struct("<4sIqqqbxHII")
+# first timestamp, last timestamp, offset of the block, length of the block
+_index_entry = struct.Struct("<qqQI")
+
+
+@dataclasses.dataclass()
+class _IndexEntry:
+    first_ts: int
+    last_ts: int
+    offset: int
+    length: int
+
+
+def _zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def _append_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _encode_column(values: typing.Iterable[int]) -> bytearray:
+    """zigzag varints, a zero is followed by the number of further zeros"""
+    out = bytearray()
+    zeros = 0
+    for value in values:
+        if value == 0:
+            zeros += 1
+            continue
+        if zeros:
+            out.append(0)
+            _append_varint(out, zeros - 1)
+            zeros = 0
+        _append_varint(out, _zigzag(value))
+    if zeros:
+        out.append(0)
+        _append_varint(out, zeros - 1)
+    return out
+
+
+def _decode_column(data: bytes) -> typing.List[int]:
+    values = []
+    value = 0
+    shift = 0
+    in_run = False
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+
+        if in_run:
+            values.extend(itertools.repeat(0, value + 1))
+            in_run = False
+        elif value == 0:
+            in_run = True
+        else:
+            values.append(_unzigzag(value))
+        value = 0
+        shift = 0
+    return values
+
+
+def _encode_block(
+    timestamps: typing.List[int], values: typing.List[int], scaler: int, unit_code: int
+) -> bytes:
+    deltas = [b - a for a, b in zip(timestamps, timestamps[1:])]
+    ts_column = _encode_column(b - a for a, b in zip(itertools.chain([0], deltas), deltas))
+    value_column = _encode_column(b - a for a, b in zip(values, values[1:]))
+    header = _block_header.pack(
+        _BLOCK_MAGIC,
+        len(timestamps),
+        timestamps[0],
+        timestamps[-1],
+        values[0],
+        scaler,
+        unit_code,
+        len(ts_column),
+        len(value_column),
+    )
+    return header + ts_column + value_column
+
+
+def _decode_block(
+    data: bytes,
+) -> typing.Tuple[typing.List[int], typing.List[int], int, int]:
+    """returns timestamps, raw values, scaler and unit code of the block"""
+    (
+        magic,
+        count,
+        first_ts,
+        _,
+        first_value,
+        scaler,
+        unit_code,
+        ts_len,
+        value_len,
+    ) = _block_header.unpack_from(data)
+    if magic != _BLOCK_MAGIC:
+        raise ValueError("not a time series block")
+
+    pos = _block_header.size
+    deltas = itertools.accumulate(_decode_column(data[pos : pos + ts_len]))
+    timestamps = list(itertools.accumulate(itertools.chain([first_ts], deltas)))
+    pos += ts_len
+    values = list(
+        itertools.accumulate(
+            itertools.chain([first_value], _decode_column(data[pos : pos + value_len]))
+        )
+    )
+    if len(timestamps) != count or len(values) != count:
+        raise ValueError(f"block should contain {count} readings")
+    return timestamps, values, scaler, unit_code
+
+
+def _to_ms(timestamp: float) -> int:
+    return int(round(timestamp * 1000))
+
+
+class _Series:
+    def __init__(self, data_path: pathlib.Path, block_size: int):
+        self.data_path = data_path
+        self.index_path = data_path.with_name(
+            data_path.name[: -len(_DATA_SUFFIX)] + _INDEX_SUFFIX
+        )
+        self.block_size = block_size
+        # set if the files on disk have to be repaired before the next write
+        self.needs_repair = False
+        self.index: typing.List[_IndexEntry] = self._load_index()
+        self.last_ts_of_blocks = [x.last_ts for x in self.index]
+
+        self.timestamps: typing.List[int] = []
+        self.values: typing.List[int] = []
+        self.scaler = 0
+        self.unit_code = 0
+
+    @property
+    def last_ts(self) -> typing.Optional[int]:
+        if self.timestamps:
+            return self.timestamps[-1]
+        if self.index:
+            return self.index[-1].last_ts
+        return None
+
+    def append(
+        self, timestamp: int, value: int, scaler: int, unit_code: int, clamp: bool = False
+    ):
+        """if clamp is set, a timestamp before the last one is replaced by it instead of raising"""
+        last_ts = self.last_ts
+        if last_ts is not None and timestamp < last_ts:
+            if not clamp:
+                raise ValueError(f"timestamps must not decrease, got {timestamp} after {last_ts}")
+            logger.debug(f"clock went back from {last_ts} to {timestamp}, using {last_ts}")
+            timestamp = last_ts
+
+        if self.timestamps and (scaler != self.scaler or unit_code != self.unit_code):
+            self.flush()
+
+        self.timestamps.append(timestamp)
+        self.values.append(value)
+        self.scaler = scaler
+        self.unit_code = unit_code
+
+        if len(self.timestamps) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        if not self.timestamps:
+            return
+
+        if self.needs_repair:
+            self._repair()
+
+        block = _encode_block(self.timestamps, self.values, self.scaler, self.unit_code)
+        self.data_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.data_path.open("ab") as f:
+            offset = f.tell()
+            f.write(block)
+
+        entry = _IndexEntry(self.timestamps[0], self.timestamps[-1], offset, len(block))
+        with self.index_path.open("ab") as f:
+            f.write(_index_entry.pack(entry.first_ts, entry.last_ts, entry.offset, entry.length))
+
+        self.index.append(entry)
+        self.last_ts_of_blocks.append(entry.last_ts)
+        self.timestamps = []
+        self.values = []
+
+    def read(
+        self, start: int, end: int
+    ) -> typing.Tuple[typing.List[float], typing.List[float]]:
+        timestamps: typing.List[float] = []
+        values: typing.List[float] = []
+
+        first_block = bisect.bisect_left(self.last_ts_of_blocks, start)
+        blocks = itertools.takewhile(
+            lambda x: x.first_ts <= end, self.index[first_block:]
+        )
+        if self.data_path.exists():
+            with self.data_path.open("rb") as f:
+                for entry in blocks:
+                    f.seek(entry.offset)
+                    block_ts, block_values, scaler, _ = _decode_block(f.read(entry.length))
+                    _extend(timestamps, values, block_ts, block_values, scaler, start, end)
+
+        if self.timestamps:
+            _extend(timestamps, values, self.timestamps, self.values, self.scaler, start, end)
+
+        return timestamps, values
+
+    def _load_index(self) -> typing.List[_IndexEntry]:
+        if not self.data_path.exists():
+            return []
+
+        index = []
+        if self.index_path.exists():
+            data = self.index_path.read_bytes()
+            usable = len(data) - len(data) % _index_entry.size
+            index = [
+                _IndexEntry(*x) for x in _index_entry.iter_unpack(data[:usable])
+            ]
+
+        data_size = self.data_path.stat().st_size
+        expected_size = index[-1].offset + index[-1].length if index else 0
+        if expected_size != data_size:
+            # only kept in memory, the files might be written by another process right now
+            logger.warning(f"index of {self.data_path} is out of date, rebuilding it")
+            index = self._rebuild_index()
+            self.needs_repair = True
+        return index
+
+    def _rebuild_index(self) -> typing.List[_IndexEntry]:
+        """scans the block headers, a block which was only written partially is ignored"""
+        index = []
+        with self.data_path.open("rb") as f:
+            data_size = f.seek(0, 2)
+            offset = 0
+            while offset + _block_header.size <= data_size:
+                f.seek(offset)
+                header = _block_header.unpack(f.read(_block_header.size))
+                magic, _, first_ts, last_ts, _, _, _, ts_len, value_len = header
+                length = _block_header.size + ts_len + value_len
+                if magic != _BLOCK_MAGIC or offset + length > data_size:
+                    break
+                index.append(_IndexEntry(first_ts, last_ts, offset, length))
+                offset += length
+        return index
+
+    def _repair(self):
+        """cuts off a partially written block and writes the rebuilt index, only done by the writer"""
+        end = self.index[-1].offset + self.index[-1].length if self.index else 0
+        with self.data_path.open("rb+") as f:
+            f.truncate(end)
+
+        with self.index_path.open("wb") as f:
+            for entry in self.index:
+                f.write(
+                    _index_entry.pack(entry.first_ts, entry.last_ts, entry.offset, entry.length)
+                )
+        self.needs_repair = False
+
+
+def _extend(
+    timestamps: typing.List[float],
+    values: typing.List[float],
+    block_ts: typing.List[int],
+    block_values: typing.List[int],
+    scaler: int,
+    start: int,
+    end: int,
+):
+    lo = bisect.bisect_left(block_ts, start)
+    hi = bisect.bisect_right(block_ts, end)
+    factor = 10 ** scaler
+    timestamps.extend(x / 1000 for x in block_ts[lo:hi])
+    values.extend(x * factor for x in block_values[lo:hi])
+
+
+class TimeSeriesStore:
+    """One directory containing a data file and an index file per series"""
+
+    def __init__(
+        self,
+        path: typing.Union[str, pathlib.Path],
+        block_size: int = DEFAULT_BLOCK_SIZE,
+    ):
+        self.path = pathlib.Path(path)
+        self.block_size = block_size
+        self._series: typing.Dict[typing.Tuple[bytes, obis.ObisCode], _Series] = {}
+
+    def append(
+        self,
+        server_id: typing.Union[str, bytes, None],
+        obis_code: obis.ObisCode,
+        timestamp: float,
+        value: int,
+        scaler: int,
+        unit_code: int,
+    ):
+        """value is the raw integer value, timestamp the time in seconds since the epoch"""
+        self._get_series(server_id, obis_code).append(
+            _to_ms(timestamp), value, scaler, unit_code
+        )
+
+    def append_sml_file(self, sml_file: sml_reader.SmlFile, timestamp: float = None) -> int:
+        """
+        stores every numeric val list entry of sml_file, returns the number of stored values.
+        If the clock went back, the values are stored at the last timestamp of their series
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        count = 0
+        for server_id, entry, _ in sml_file.get_numeric_values():
+            self._get_series(server_id, entry.obj_name).append(
+                _to_ms(timestamp),
+                entry.value,
+                entry.scaler,
+                entry.unit_code or 0,
+                clamp=True,
+            )
+            count += 1
+        return count
+
+    def read_columns(
+        self,
+        server_id: typing.Union[str, bytes, None],
+        obis_code: obis.ObisCode,
+        start: float = None,
+        end: float = None,
+    ) -> typing.Tuple[typing.List[float], typing.List[float]]:
+        """returns the timestamps and scaled values of the series between start and end (both inclusive)"""
+        start_ms = -(1 << 63) if start is None else _to_ms(start)
+        end_ms = (1 << 63) - 1 if end is None else _to_ms(end)
+        return self._get_series(server_id, obis_code).read(start_ms, end_ms)
+
+    def read(
+        self,
+        server_id: typing.Union[str, bytes, None],
+        obis_code: obis.ObisCode,
+        start: float = None,
+        end: float = None,
+    ) -> typing.Iterator[typing.Tuple[float, float]]:
+        """yields (timestamp, scaled value) of the series between start and end (both inclusive)"""
+        timestamps, values = self.read_columns(server_id, obis_code, start, end)
+        return zip(timestamps, values)
+
+    def series(self) -> typing.List[typing.Tuple[bytes, obis.ObisCode]]:
+        """all series which are either stored or buffered"""
+        result = set(self._series.keys())
+        if self.path.exists():
+            for data_path in self.path.glob(f"*/*{_DATA_SUFFIX}"):
+                server_dir = data_path.parent.name
+                server_id = b"" if server_dir == _NO_SERVER_ID else bytes.fromhex(server_dir)
+                packed = int(data_path.name[: -len(_DATA_SUFFIX)], 16)
+                result.add((server_id, obis.ObisCode.from_int(packed)))
+        return sorted(result)
+
+    def flush(self):
+        for series in self._series.values():
+            series.flush()
+
+    def close(self):
+        self.flush()
+        self._series = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _get_series(
+        self, server_id: typing.Union[str, bytes, None], obis_code: obis.ObisCode
+    ) -> _Series:
+        server_id = sml_reader.server_id_to_bytes(server_id)
+        key = (server_id, obis_code)
+        series = self._series.get(key)
+        if series is None:
+            server_dir = server_id.hex() if server_id else _NO_SERVER_ID
+            data_path = self.path / server_dir / f"{obis_code.packed:012x}{_DATA_SUFFIX}"
+            series = _Series(data_path, self.block_size)
+            self._series[key] = series
+        return series
+
+
+async def record(
+    sml_files: typing.AsyncIterator[sml_reader.SmlFile], store: TimeSeriesStore
+) -> typing.AsyncIterator[sml_reader.SmlFile]:
+    """appends the numeric values of every sml file to their series in store, the files are yielded unchanged"""
+    async for sml_file in sml_files:
+        store.append_sml_file(sml_file)
+        yield sml_file
@@ -0,0 +1,32 @@
+"""sample data shared by the tests, importing this module has no side effects"""
+
+import asyncio
+
+raw_sml = (
+    "1b1b1b1b01010101760700110bf402df620062007263010176010107001103c500f50b0901454d4800007514c401016375f3007"
+    "60700110bf402e0620062007263070177010b0901454d4800007514c4070100620affff7262016503c5853c7a77078181c78203"
+    "ff0101010104454d480177070100000009ff010101010b0901454d4800007514c40177070100010800ff6401018201621e52ff5"
+    "600051bdfde0177070100020800ff6401018201621e52ff5600000006070177070100010801ff0101621e52ff5600051bdfde017"
+    "7070100020801ff0101621e52ff5600000006070177070100010802ff0101621e52ff5600000000000177070100020802ff010162"
+    "1e52ff5600000000000177070100100700ff0101621b52ff55000014f40177078181c78205ff010101018302957c486aaf8c92a2"
+    "57ec681e215fddeff32a2dbf2c8a88721777f5f01e5ed5ccaa694dd48c14dc5589d28e0c5b9ce88e01010163b4c800760700110"
+    "bf402e362006200726302017101634e85001b1b1b1b1a000337"
+)
+
+# the server id of the meter in raw_sml
+server_id = bytes.fromhex("0901454d4800007514c4")
+
+
+async def iterate(*items):
+    """an async iterator over items, used as the source of a stage"""
+    for item in items:
+        yield item
+
+
+def collect(stage) -> list:
+    """runs the async iterator stage to its end and returns everything it yielded"""
+
+    async def run():
+        return [x async for x in stage]
+
+    return asyncio.run(run())
@@ -0,0 +1,102 @@
+import pytest
+
+from smlpy import aggregation, sml_reader
+from smlpy.obis import ObisCode
+
+from test.data import collect, iterate, raw_sml, server_id
+
+power = ObisCode(1, 0, 16, 7, 0)
+energy = ObisCode(1, 0, 1, 8, 0)
+
+
+def test_tumbling_window():
+    aggregator = aggregation.Aggregator([aggregation.Window(60)])
+
+    records = []
+    for i, value in enumerate([100, 200, 300, 400]):
+        records += aggregator.add(server_id, power, 30.0 * i, value, "W")
+
+    assert len(records) == 1
+    record = records[0]
+    assert (record.start, record.end) == (0.0, 60.0)
+    assert (record.count, record.min, record.max, record.avg) == (2, 100, 200, 150)
+    assert record.increase is None
+    assert record.unit == "W"
+
+    (last,) = aggregator.flush()
+    assert (last.start, last.first, last.last) == (60.0, 300, 400)
+    assert aggregator.flush() == []
+
+
+def test_sliding_window():
+    aggregator = aggregation.Aggregator([aggregation.Window(30, step=10)])
+
+    records = []
+    for i in range(6):
+        records += aggregator.add(server_id, power, 10.0 * i, i)
+
+    assert [(x.start, x.end, x.sum) for x in records] == [
+        (-20.0, 10.0, 0),
+        (-10.0, 20.0, 1),
+        (0.0, 30.0, 3),
+        (10.0, 40.0, 6),
+        (20.0, 50.0, 9),
+    ]
+
+
+def test_counter_increase_with_reset_and_rollover():
+    aggregator = aggregation.Aggregator([aggregation.Window(60)], rollover=1000)
+
+    for timestamp, value in [(0, 900), (10, 950), (20, 990), (30, 20), (40, 30), (50, 5)]:
+        assert aggregator.add(server_id, energy, timestamp, value) == []
+    (record,) = aggregator.advance(60)
+
+    assert record.increase == 50 + 40 + 30 + 10 + 5
+    assert record.resets == 1
+
+
+def test_gaps_and_late_values():
+    aggregator = aggregation.Aggregator([aggregation.Window(60)])
+
+    aggregator.add(server_id, power, 0, 1)
+    records = aggregator.add(server_id, power, 3600, 2)
+    assert [x.start for x in records] == [0.0]
+
+    aggregator.advance(3660)
+    assert aggregator.add(server_id, power, 3610, 3) == []
+    assert aggregator.flush() == []
+
+
+def test_out_of_order_values_go_into_their_own_window():
+    aggregator = aggregation.Aggregator([aggregation.Window(60)])
+
+    aggregator.add(server_id, power, 0, 1)
+    assert [x.start for x in aggregator.add(server_id, power, 61, 2)] == [0.0]
+    # its window was already emitted
+    assert aggregator.add(server_id, power, 30, 99) == []
+
+    records = aggregator.add(server_id, power, 200, 3)
+    assert [(x.start, x.count, x.max) for x in records] == [(60.0, 1, 2)]
+    # the window of this value is still open, but it is not the current one
+    assert aggregator.add(server_id, power, 130, 4) == []
+
+    records = aggregator.flush()
+    assert [(x.start, x.count, x.max) for x in records] == [(120.0, 1, 4), (180.0, 1, 3)]
+
+
+def test_invalid_window():
+    with pytest.raises(ValueError):
+        aggregation.Window(60, step=25)
+
+
+def test_aggregate_stage():
+    sml_file = sml_reader.SmlReader(raw_sml).read_sml_file()
+
+    aggregator = aggregation.Aggregator([aggregation.Window(60)])
+    assert collect(aggregation.aggregate(iterate(sml_file), aggregator)) == []
+
+    records = aggregator.flush()
+    assert len(records) == 7
+    energy_record = next(x for x in records if x.obis_code == energy)
+    assert energy_record.increase == 0
+    assert energy_record.unit == "Wh"
@@ -0,0 +1,65 @@
+import pytest
+
+from smlpy import archive
+
+from test.data import raw_sml
+
+frame = bytes.fromhex(raw_sml)
+
+
+def test_read_time_window(tmp_path):
+    with archive.FrameArchive(tmp_path, segment_size=2000, index_interval=3) as writer:
+        for i in range(40):
+            writer.append(frame + bytes([i]), timestamp=100.0 + i, port="/dev/ttyUSB0")
+
+    assert len(list(tmp_path.glob("*.frames"))) > 3
+    reader = archive.ArchiveReader(tmp_path)
+
+    frames = list(reader.iter_frames(117.0, 121.5))
+    assert [x.timestamp for x in frames] == [117.0, 118.0, 119.0, 120.0, 121.0]
+    assert frames[0].data == frame + bytes([17])
+    assert frames[0].port == "/dev/ttyUSB0"
+    assert len(list(reader.iter_frames())) == 40
+    assert list(reader.iter_frames(200.0)) == []
+
+
+def test_new_writer_starts_new_segment(tmp_path):
+    with archive.FrameArchive(tmp_path) as writer:
+        writer.append(frame, timestamp=1.0)
+    with archive.FrameArchive(tmp_path) as writer:
+        writer.append(frame, timestamp=2.0)
+
+    assert len(list(tmp_path.glob("*.frames"))) == 2
+    assert [x.timestamp for x in archive.ArchiveReader(tmp_path).iter_frames(1.5)] == [2.0]
+
+
+def test_reparse_and_partial_frame(tmp_path):
+    with archive.FrameArchive(tmp_path) as writer:
+        writer.append(frame, timestamp=1.0)
+        writer.append(b"\x00" * 20, timestamp=2.0)
+        writer.append(frame, timestamp=3.0)
+
+    segment = next(tmp_path.glob("*.frames"))
+    with segment.open("ab") as f:
+        f.write(b"\x99\x00\x00\x00")
+    next(tmp_path.glob("*.idx")).unlink()
+
+    results = list(archive.ArchiveReader(tmp_path).iter_sml_files())
+    assert [x.timestamp for x, _ in results] == [1.0, 3.0]
+    assert len(results[0][1].data) == 3
+
+
+def test_clock_going_back(tmp_path, monkeypatch):
+    with archive.FrameArchive(tmp_path) as writer:
+        writer.append(frame, timestamp=100.0)
+        monkeypatch.setattr(archive.time, "time", lambda: 50.0)
+        writer.append(frame)
+        with pytest.raises(ValueError):
+            writer.append(frame, timestamp=60.0)
+    # the previous receive time is kept by a new writer
+    with archive.FrameArchive(tmp_path) as writer:
+        writer.append(frame)
+
+    reader = archive.ArchiveReader(tmp_path)
+    assert [x.timestamp for x in reader.iter_frames()] == [100.0, 100.0, 100.0]
+    assert len(list(reader.iter_frames(100.0, 100.0))) == 3
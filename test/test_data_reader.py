@@ -0,0 +1,188 @@
+import asyncio
+
+import serial
+import serial_asyncio
+
+from smlpy import archive, data_reader, parse_cache
+
+from test.data import raw_sml
+
+port_settings = data_reader.PortSettings(
+    port="/dev/ttyUSB0",
+    baudrate=9600,
+    bytesize=serial.EIGHTBITS,
+    parity=serial.PARITY_NONE,
+    stopbits=serial.STOPBITS_ONE,
+    wait_time=1,
+)
+
+
+class FakeWriter:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def fake_port(monkeypatch):
+    """replaces the serial port, returns the list of opened (reader, writer) pairs"""
+    opened = []
+
+    async def open_serial_connection(**kwargs):
+        await asyncio.sleep(0)  # opening a real port takes a while
+        reader = asyncio.StreamReader()
+        writer = FakeWriter()
+        opened.append((reader, writer))
+        return reader, writer
+
+    monkeypatch.setattr(serial_asyncio, "open_serial_connection", open_serial_connection)
+    monkeypatch.setattr(data_reader, "WAIT_TIME", 0)
+    return opened
+
+
+def test_connection_returns_latest_file(monkeypatch):
+    opened = fake_port(monkeypatch)
+
+    async def run():
+        connection = data_reader.MeterConnection(port_settings)
+        await connection.open()
+        reader, _ = opened[0]
+        reader.feed_data(bytes.fromhex(raw_sml))
+
+        first = await connection.read_one(timeout=1)
+        assert len(first.data) == 3
+        assert await connection.read_one(timeout=1) is first
+
+        waiting = asyncio.create_task(connection.read_one(timeout=1, wait_for_next=True))
+        await asyncio.sleep(0.01)
+        reader.feed_data(bytes.fromhex(raw_sml))
+        second = await waiting
+        assert second is not first
+
+        connection.close()
+        assert opened[0][1].closed
+
+    asyncio.run(run())
+
+
+def test_connection_returns_newest_of_several_frames(monkeypatch):
+    opened = fake_port(monkeypatch)
+    frames = [raw_sml.replace("0700110bf402", f"0700110b{i:04x}") for i in range(3)]
+
+    async def run():
+        connection = data_reader.MeterConnection(port_settings)
+        await connection.open()
+        opened[0][0].feed_data(bytes.fromhex("".join(frames) + frames[0][:40]))
+
+        result = await connection.read_one(timeout=1)
+        connection.close()
+        return result
+
+    result = asyncio.run(run())
+    assert result.data[0].transaction_id == "\x00\x11\x0b\x00\x02\xdf"
+
+
+def test_concurrent_reads_open_the_port_once(monkeypatch):
+    opened = fake_port(monkeypatch)
+
+    async def run():
+        pool = data_reader.ConnectionPool()
+        readings = [
+            asyncio.create_task(pool.read_one(port_settings, timeout=1)) for _ in range(3)
+        ]
+        await asyncio.sleep(0.01)
+        assert len(opened) == 1
+        opened[0][0].feed_data(bytes.fromhex(raw_sml))
+        results = await asyncio.gather(*readings)
+        pool.close()
+        return results
+
+    results = asyncio.run(run())
+    assert all(x is results[0] for x in results)
+    assert opened[0][1].closed
+
+
+def test_connection_closes_when_idle(monkeypatch):
+    opened = fake_port(monkeypatch)
+
+    async def run():
+        pool = data_reader.ConnectionPool(idle_timeout=0.05)
+        connection = pool.get(port_settings)
+        await connection.open()
+        opened[0][0].feed_data(bytes.fromhex(raw_sml))
+        await pool.read_one(port_settings, timeout=1)
+        assert pool.get(port_settings) is connection
+
+        await asyncio.sleep(0.2)
+        assert not connection.is_open
+        assert opened[0][1].closed
+
+        reading = asyncio.create_task(pool.read_one(port_settings, timeout=1))
+        await asyncio.sleep(0.01)
+        assert len(opened) == 2
+        opened[1][0].feed_data(bytes.fromhex(raw_sml))
+        assert len((await reading).data) == 3
+        pool.close()
+
+    asyncio.run(run())
+
+
+def test_received_frames_are_archived(monkeypatch, tmp_path):
+    opened = fake_port(monkeypatch)
+
+    async def run():
+        with archive.FrameArchive(tmp_path) as frame_archive:
+            results = data_reader.main(port_settings, archive=frame_archive)
+            reading = asyncio.create_task(results.__anext__())
+            await asyncio.sleep(0.01)
+            # the port was opened in the middle of a frame
+            frame = bytes.fromhex(raw_sml)
+            opened[0][0].feed_data(frame[100:] + frame + b"\x00" + frame)
+            await asyncio.wait_for(reading, 1)
+            await asyncio.wait_for(results.__anext__(), 1)
+            await results.aclose()
+
+    asyncio.run(run())
+
+    frames = list(archive.ArchiveReader(tmp_path).iter_frames())
+    assert [x.data.hex() for x in frames] == [raw_sml, raw_sml]
+    assert frames[0].port == "/dev/ttyUSB0"
+
+
+def test_main_and_connections_use_the_cache(monkeypatch):
+    opened = fake_port(monkeypatch)
+    cache = parse_cache.ParseCache()
+    frame = bytes.fromhex(raw_sml)
+
+    async def run():
+        results = data_reader.main(port_settings, cache=cache)
+        reading = asyncio.create_task(results.__anext__())
+        await asyncio.sleep(0.01)
+        opened[0][0].feed_data(frame + frame)
+        first = await asyncio.wait_for(reading, 1)
+        second = await asyncio.wait_for(results.__anext__(), 1)
+        await results.aclose()
+
+        pool = data_reader.ConnectionPool(cache=cache)
+        reading = asyncio.create_task(pool.read_one(port_settings, timeout=1))
+        await asyncio.sleep(0.01)
+        opened[1][0].feed_data(frame)
+        third = await reading
+        pool.close()
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+
+    assert first is second is third
+    assert cache.stats().hits == 2
+
+
+def test_split_frames_keeps_partial_data():
+    data = "00" + raw_sml + raw_sml[:50]
+    frames, rest = data_reader.split_frames(data)
+    assert frames == [raw_sml]
+    assert rest == raw_sml[:50]
+
+    frames, rest = data_reader.split_frames(rest + raw_sml[50:] + "0" + raw_sml[:10])
+    assert frames == [raw_sml]
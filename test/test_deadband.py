@@ -0,0 +1,55 @@
+from smlpy import deadband, sml_reader
+from smlpy.obis import ObisCode
+
+from test.data import collect, iterate, raw_sml, server_id
+
+power = ObisCode(1, 0, 16, 7, 0)
+energy = ObisCode(1, 0, 1, 8, 0)
+
+
+def test_only_changes_are_emitted():
+    sml_file = sml_reader.SmlReader(raw_sml).read_sml_file()
+    deadband_filter = deadband.DeadbandFilter()
+
+    records = deadband_filter.process(sml_file, timestamp=1.0)
+    assert len(records) == 7
+    power_record = next(x for x in records if x.obis_code == power)
+    assert power_record == deadband.ChangeRecord(server_id, power, 1.0, 536.4, "W")
+
+    assert deadband_filter.process(sml_file, timestamp=2.0) == []
+
+
+def test_absolute_and_relative_deadband():
+    deadband_filter = deadband.DeadbandFilter(
+        default=deadband.Deadband(relative=0.1),
+        series={"1-0:1.8.*": deadband.Deadband(absolute=5)},
+    )
+
+    assert deadband_filter.update(server_id, energy, 100, 1.0)
+    assert not deadband_filter.update(server_id, energy, 105, 2.0)
+    assert deadband_filter.update(server_id, energy, 105.5, 3.0)
+
+    assert deadband_filter.update(server_id, power, 500, 1.0)
+    assert not deadband_filter.update(server_id, power, 549, 2.0)
+    assert deadband_filter.update(server_id, power, 551, 3.0)
+    assert deadband_filter.update(b"other meter", power, 551, 3.0)
+
+
+def test_heartbeat():
+    deadband_filter = deadband.DeadbandFilter(
+        series={energy: deadband.Deadband(heartbeat=60)}
+    )
+
+    assert deadband_filter.update(server_id, energy, 100, 0.0)
+    assert not deadband_filter.update(server_id, energy, 100, 59.0)
+    assert deadband_filter.update(server_id, energy, 100, 60.0)
+    assert deadband_filter.update(server_id, power, 1, 0.0)
+    assert not deadband_filter.update(server_id, power, 1, 1000.0)
+
+
+def test_changes_stage():
+    sml_file = sml_reader.SmlReader(raw_sml).read_sml_file()
+
+    records = collect(deadband.changes(iterate(sml_file, sml_file), deadband.DeadbandFilter()))
+    # the second file repeats the values of the first one
+    assert len(records) == 7
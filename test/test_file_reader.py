@@ -0,0 +1,73 @@
+import pytest
+
+import smlpy
+from smlpy import file_reader
+
+from test.data import raw_sml
+
+
+def test_reads_binary_capture(tmp_path):
+    frame = bytes.fromhex(raw_sml)
+    capture = tmp_path / "capture.bin"
+    capture.write_bytes(b"\x00\x1b garbage" + frame + b"\x00" * 7 + frame)
+
+    results = list(smlpy.iter_sml_files(capture))
+
+    assert len(results) == 2
+    assert results[0].offset == 10
+    assert results[0].end == 10 + len(frame)
+    assert results[1].offset == 10 + len(frame) + 7
+    assert results[1].index == 1
+    assert len(results[1].sml_file.data) == 3
+
+
+def test_reads_hex_capture(tmp_path):
+    capture = tmp_path / "capture.hex"
+    capture.write_text(raw_sml.upper() + "\n" + raw_sml.upper() + "\n")
+
+    results = list(file_reader.iter_sml_files(capture))
+
+    assert [x.offset for x in results] == [0, len(raw_sml) + 1]
+    assert results[0].sml_file.data[1].message_body.val_list[2].value == 85712862
+
+
+def test_can_resume(tmp_path):
+    frame = bytes.fromhex(raw_sml)
+    capture = tmp_path / "capture.bin"
+    capture.write_bytes(frame * 3)
+
+    first = next(file_reader.iter_sml_files(capture))
+    rest = list(file_reader.iter_sml_files(capture, offset=first.end))
+    skipped = list(file_reader.iter_sml_files(capture, index=2))
+
+    assert [x.offset for x in rest] == [len(frame), 2 * len(frame)]
+    assert [x.offset for x in skipped] == [2 * len(frame)]
+
+
+def test_skips_broken_and_truncated_frames(tmp_path):
+    frame = bytes.fromhex(raw_sml)
+    capture = tmp_path / "capture.bin"
+    capture.write_bytes(frame[:100] + frame + frame[:-2])
+
+    results = list(file_reader.iter_sml_files(capture))
+
+    assert [x.offset for x in results] == [100]
+
+
+def test_skips_frames_with_corrupt_bytes_in_hex_capture(tmp_path):
+    capture = tmp_path / "capture.hex"
+    corrupt = raw_sml[:100].encode() + b"\xff" + raw_sml[100:].encode()
+    capture.write_bytes(corrupt + b"\n" + raw_sml.encode() + b"\n")
+
+    results = list(file_reader.iter_sml_files(capture, is_hex=True))
+
+    assert [x.index for x in results] == [1]
+    with pytest.raises(UnicodeDecodeError):
+        list(file_reader.iter_sml_files(capture, is_hex=True, strict=True))
+
+
+def test_empty_capture(tmp_path):
+    capture = tmp_path / "capture.bin"
+    capture.write_bytes(b"")
+
+    assert list(file_reader.iter_sml_files(capture)) == []
@@ -0,0 +1,53 @@
+import pickle
+
+import pytest
+
+from smlpy.obis import ObisCode, ObisPattern
+
+
+def test_text_form():
+    code = ObisCode.from_hex("0100010800ff")
+
+    assert str(code) == "1-0.1.8.0"
+    assert str(ObisCode(1, 0, 1, 8, 0, 1)) == "1-0.1.8.0*1"
+    assert code.groups == (1, 0, 1, 8, 0, 255)
+    assert code.to_bytes() == bytes.fromhex("0100010800ff")
+
+
+def test_parse():
+    code = ObisCode(1, 0, 1, 8, 0)
+
+    assert ObisCode.from_str("1-0:1.8.0*255") == code
+    assert ObisCode.from_str("1-0:1.8.0") == code
+    assert ObisCode.from_str("1-0.1.8.0") == code
+    assert ObisCode.from_int(code.packed) == code
+
+    with pytest.raises(ValueError):
+        ObisCode.from_str("1-0:1.8.*")
+    with pytest.raises(ValueError):
+        ObisCode.from_str("1-0:1.8.256")
+
+
+def test_hash_and_equality():
+    code = ObisCode(1, 0, 1, 8, 0)
+
+    assert {code: 1}[ObisCode.from_hex("0100010800ff")] == 1
+    assert code == "1-0.1.8.0"
+    assert "1-0:1.8.0*255" == code
+    assert code != "1-0.1.8.1"
+    assert code != "1-0:1.8.*"
+    assert code != "not an obis code"
+    assert pickle.loads(pickle.dumps(code)) == code
+    with pytest.raises(AttributeError):
+        code.foo = 1
+
+
+def test_wildcards():
+    code = ObisCode(1, 0, 1, 8, 2)
+
+    assert code.matches("1-0:1.8.*")
+    assert code.matches("1-b:1.8.e")
+    assert code.matches(ObisPattern.from_str("*-*:*.*.*"))
+    assert not code.matches("1-0:2.8.*")
+    assert not ObisCode(1, 0, 1, 8, 2, 1).matches("1-0:1.8.*")
+    assert ObisCode(1, 0, 1, 8, 2, 1).matches("1-0:1.8.e*f")
@@ -0,0 +1,99 @@
+import asyncio
+
+from smlpy import data_reader, parse_cache, sml_reader
+
+from test.data import raw_sml
+
+# the same frame with other transaction ids, like the next frame of an idle meter
+next_sml = raw_sml.replace("0700110bf402", "0700110bf403")
+
+
+def _values(sml_file):
+    # times sent as elapsed seconds depend on when they were parsed, so only the values are compared
+    return [
+        (server_id, x.obj_name, value, x.unit)
+        for server_id, x, value in sml_file.get_numeric_values()
+    ]
+
+
+def test_repeated_frame_is_parsed_once():
+    cache = parse_cache.ParseCache()
+
+    first = sml_reader.SmlReader(raw_sml, cache).read_sml_file()
+    second = sml_reader.SmlReader(raw_sml, cache).read_sml_file()
+
+    assert second is first
+    stats = cache.stats()
+    assert stats.hits == 1
+    assert stats.entries > 1  # the frame and its message bodies
+    assert stats.hit_rate > 0
+
+
+def test_message_bodies_are_shared_between_frames():
+    cache = parse_cache.ParseCache()
+
+    first = sml_reader.SmlReader(raw_sml, cache).read_sml_file()
+    hits = cache.stats().hits
+    second = sml_reader.SmlReader(next_sml, cache).read_sml_file()
+
+    assert second is not first
+    assert cache.stats().hits > hits
+    assert second.data[1].message_body is first.data[1].message_body
+    assert [x.transaction_id for x in second.data] != [x.transaction_id for x in first.data]
+    assert _values(second) == _values(sml_reader.SmlReader(next_sml).read_sml_file())
+
+
+def test_cached_result_equals_parsed_result():
+    cache = parse_cache.ParseCache()
+    sml_reader.SmlReader(next_sml, cache).read_sml_file()
+
+    result = sml_reader.SmlReader(raw_sml, cache).read_sml_file()
+
+    assert _values(result) == _values(sml_reader.SmlReader(raw_sml).read_sml_file())
+
+
+def test_cache_is_bounded():
+    cache = parse_cache.ParseCache(max_bytes=20_000)
+
+    for i in range(50):
+        frame = raw_sml.replace("0700110bf402", f"0700110b{i:04x}")
+        frame = frame.replace("00051bdfde", f"0005{i:06x}")
+        sml_reader.SmlReader(frame, cache).read_sml_file()
+
+    stats = cache.stats()
+    assert stats.size <= 20_000
+    assert stats.evictions > 0
+    assert stats.entries < 50
+
+
+def test_put_replaces_and_clear_empties():
+    cache = parse_cache.ParseCache(max_bytes=1000)
+    key = cache.digest("00")
+
+    cache.put(key, "a", 10)
+    cache.put(key, "b", 10)
+    cache.put(cache.digest("01"), "too large", 1000)
+
+    assert cache.get(key) == "b"
+    assert cache.stats().entries == 1
+    cache.clear()
+    assert cache.get(key) is None
+    assert cache.stats().size == 0
+
+
+def test_read_with_cache():
+    cache = parse_cache.ParseCache()
+
+    async def run():
+        queue = asyncio.Queue()
+        for _ in range(3):
+            queue.put_nowait(raw_sml)
+        results = data_reader.read(queue, cache=cache)
+        sml_files = [await results.__anext__() for _ in range(3)]
+        await results.aclose()
+        return sml_files
+
+    sml_files = asyncio.run(run())
+
+    assert sml_files[0] is sml_files[1] is sml_files[2]
+    assert cache.stats().hits == 2
@@ -0,0 +1,251 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import resource
+import struct
+
+import pytest
+
+from smlpy import push_server, sml_reader
+from smlpy.obis import ObisCode
+
+from test.data import raw_sml
+
+N_VALUES = 7  # numeric values in raw_sml
+power = ObisCode(1, 0, 16, 7, 0)
+
+
+def _sml_file():
+    return sml_reader.SmlReader(raw_sml).read_sml_file()
+
+
+async def _start():
+    server = push_server.PushServer()
+    tcp = await server.serve()
+    return server, tcp.sockets[0].getsockname()[1]
+
+
+async def _wait_for(condition, timeout=5):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+async def _stop(server, *writers):
+    for writer in writers:
+        writer.close()
+    await _wait_for(lambda: server.subscribers == 0)
+    server.close()
+
+
+async def _read_lines(reader, n):
+    return [json.loads(await asyncio.wait_for(reader.readline(), 5)) for _ in range(n)]
+
+
+def test_subscribers_receive_readings():
+    async def run():
+        server, port = await _start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        await _wait_for(lambda: server.subscribers == 1)
+
+        assert server.publish(_sml_file(), timestamp=100) == N_VALUES
+        lines = await _read_lines(reader, N_VALUES)
+        await _stop(server, writer)
+        return lines
+
+    lines = asyncio.run(run())
+
+    assert {x["timestamp"] for x in lines} == {100}
+    assert {x["server_id"] for x in lines} == {"0901454d4800007514c4"}
+    by_obis = {x["obis"]: x for x in lines}
+    assert by_obis[str(power)]["value"] == 536.4
+    assert by_obis[str(power)]["unit"] == "W"
+
+
+def test_new_subscribers_receive_latest_values():
+    async def run():
+        server, port = await _start()
+        server.publish(_sml_file(), timestamp=1)
+        server.publish(_sml_file(), timestamp=2)
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        lines = await _read_lines(reader, N_VALUES)
+        await _stop(server, writer)
+        return lines
+
+    lines = asyncio.run(run())
+
+    assert len({x["obis"] for x in lines}) == N_VALUES
+    assert {x["timestamp"] for x in lines} == {2}
+
+
+def test_filter_by_obis_code():
+    async def run():
+        server, port = await _start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        await _wait_for(lambda: server.subscribers == 1)
+        subscriber = next(iter(server._subscribers))
+
+        writer.write(b'{"obis": ["1-0:16.7.*", "1-0:2.8.0"]}\n')
+        await _wait_for(lambda: subscriber.filters is not None)
+        server.publish(_sml_file(), timestamp=1)
+        filtered = await _read_lines(reader, 2)
+
+        writer.write(b'{"obis": 5}\n')
+        error = await _read_lines(reader, 1)
+
+        writer.write(b'{"obis": null}\n')
+        await _wait_for(lambda: subscriber.filters is None)
+        everything = await _read_lines(reader, N_VALUES)
+        await _stop(server, writer)
+        return filtered, error, everything
+
+    filtered, error, everything = asyncio.run(run())
+
+    assert sorted(x["obis"] for x in filtered) == ["1-0.16.7.0", "1-0.2.8.0"]
+    assert "error" in error[0]
+    assert len({x["obis"] for x in everything}) == N_VALUES
+
+
+def test_buffer_keeps_latest_value_per_series():
+    async def run():
+        subscriber = push_server._Subscriber(
+            "test", None, push_server._encode_line, max_pending=2
+        )
+        codes = [ObisCode(1, 0, 1, 8, x) for x in range(3)]
+        for value in range(3):
+            reading = push_server._EncodedReading(codes[0], b"%d" % value)
+            subscriber.offer((b"", codes[0]), reading)
+        subscriber.offer((b"", codes[1]), push_server._EncodedReading(codes[1], b"x"))
+        subscriber.offer((b"", codes[2]), push_server._EncodedReading(codes[2], b"y"))
+        return subscriber
+
+    subscriber = asyncio.run(run())
+
+    assert [x.line for x in subscriber._pending.values()] == [b"x", b"y"]
+    assert subscriber.dropped == 1
+
+
+def _websocket_frame(opcode, payload):
+    mask = os.urandom(4)
+    masked = bytes(x ^ mask[i % 4] for i, x in enumerate(payload))
+    return struct.pack(">BB", 0x80 | opcode, 0x80 | len(payload)) + mask + masked
+
+
+async def _read_websocket_frame(reader):
+    first, length = await asyncio.wait_for(reader.readexactly(2), 5)
+    if length == 126:
+        (length,) = struct.unpack(">H", await reader.readexactly(2))
+    return first & 0x0F, await reader.readexactly(length)
+
+
+def test_websocket():
+    async def run():
+        server = push_server.PushServer()
+        websocket = await server.serve_websocket()
+        port = websocket.sockets[0].getsockname()[1]
+        server.publish(_sml_file(), timestamp=1)
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write(
+            (
+                "GET /readings HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\n"
+                f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+                "Sec-WebSocket-Version: 13\r\n\r\n"
+            ).encode()
+        )
+        response = (await reader.readuntil(b"\r\n\r\n")).decode()
+        latest = [await _read_websocket_frame(reader) for _ in range(N_VALUES)]
+
+        await _wait_for(lambda: server.subscribers == 1)
+        subscriber = next(iter(server._subscribers))
+        writer.write(_websocket_frame(0x1, b'{"obis": "1-0:16.7.0"}'))
+        await _wait_for(lambda: subscriber.filters is not None)
+        server.publish(_sml_file(), timestamp=2)
+        # the latest value of the new filter may arrive before the published one
+        filtered = [await _read_websocket_frame(reader)]
+        while json.loads(filtered[-1][1])["timestamp"] != 2:
+            filtered.append(await _read_websocket_frame(reader))
+
+        writer.write(_websocket_frame(0x9, b"ping"))
+        pong = await _read_websocket_frame(reader)
+        writer.write(_websocket_frame(0x8, b"\x03\xe8"))
+        close = await _read_websocket_frame(reader)
+
+        await _stop(server, writer)
+        return key, response, latest, filtered, pong, close
+
+    key, response, latest, filtered, pong, close = asyncio.run(run())
+
+    accept = base64.b64encode(
+        hashlib.sha1((key + "258EAFA5-E914-47DA-95CA-C5AB0DC85B11").encode()).digest()
+    ).decode()
+    assert response.startswith("HTTP/1.1 101")
+    assert f"Sec-WebSocket-Accept: {accept}" in response
+    assert {x[0] for x in latest} == {0x1}
+    assert {x[0] for x in filtered} == {0x1}
+    assert {json.loads(x[1])["obis"] for x in filtered} == {str(power)}
+    assert pong == (0xA, b"ping")
+    assert close == (0x8, b"\x03\xe8")
+
+
+def _raise_file_limit(n):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft >= n:
+        return True
+    if hard != resource.RLIM_INFINITY and hard < n:
+        return False
+    resource.setrlimit(resource.RLIMIT_NOFILE, (n, hard))
+    return True
+
+
+def test_load_1000_subscribers():
+    n_subscribers = 1000
+    n_frames = 50
+    # every connection needs a socket on the client and the server side
+    if not _raise_file_limit(2 * n_subscribers + 100):
+        pytest.skip("the open file limit is too low for 1000 connections")
+
+    async def subscribe(port, last_timestamp):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        received = 0
+        latest = set()
+        try:
+            while len(latest) < N_VALUES:
+                reading = json.loads(await reader.readline())
+                received += 1
+                if reading["timestamp"] == last_timestamp:
+                    latest.add(reading["obis"])
+        finally:
+            writer.close()
+        return received
+
+    async def run():
+        server, port = await _start()
+        # a subscriber which never reads must not hold up the others
+        _, idle_writer = await asyncio.open_connection("127.0.0.1", port)
+        clients = [
+            asyncio.ensure_future(subscribe(port, n_frames - 1))
+            for _ in range(n_subscribers)
+        ]
+        await _wait_for(lambda: server.subscribers == n_subscribers + 1, timeout=30)
+
+        sml_file = _sml_file()
+        for timestamp in range(n_frames):
+            server.publish(sml_file, timestamp=timestamp)
+            await asyncio.sleep(0)
+        received = await asyncio.wait_for(asyncio.gather(*clients), 60)
+
+        await _stop(server, idle_writer)
+        return received
+
+    received = asyncio.run(run())
+
+    assert len(received) == n_subscribers
+    # slow subscribers skip intermediate values, but never receive more than were published
+    assert all(N_VALUES <= x <= N_VALUES * n_frames for x in received)
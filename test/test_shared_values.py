@@ -0,0 +1,62 @@
+import multiprocessing
+
+from smlpy import shared_values, sml_reader
+from smlpy.obis import ObisCode
+
+from test.data import collect, iterate, raw_sml, server_id
+
+
+def _read_in_other_process(name, queue):
+    with shared_values.SharedValueReader(name) as reader:
+        value = reader.get(server_id, ObisCode(1, 0, 1, 8, 0))
+        queue.put((round(value.value, 1), value.unit))
+
+
+def test_publish_and_read():
+    sml_file = sml_reader.SmlReader(raw_sml).read_sml_file()
+
+    with shared_values.SharedValueTable(capacity=16) as table:
+        assert table.publish(sml_file, timestamp=10.0) == 7
+
+        with shared_values.SharedValueReader(table.name) as reader:
+            value = reader.get(server_id, ObisCode(1, 0, 16, 7, 0))
+            assert value.value == 536.4
+            assert value.scaler == -1
+            assert value.unit == "W"
+            assert value.timestamp == 10.0
+            assert reader.get(server_id, ObisCode(1, 0, 99, 7, 0)) is None
+
+            table.update(server_id, ObisCode(1, 0, 16, 7, 0), 600.0, -1, 27, 11.0)
+            assert reader.get(server_id, ObisCode(1, 0, 16, 7, 0)).value == 600.0
+            assert len(reader.read_all()) == 7
+
+
+def test_read_from_other_process():
+    sml_file = sml_reader.SmlReader(raw_sml).read_sml_file()
+
+    with shared_values.SharedValueTable() as table:
+        table.publish(sml_file)
+
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=_read_in_other_process, args=(table.name, queue)
+        )
+        process.start()
+        process.join(10)
+
+        assert queue.get(timeout=1) == (8571286.2, "Wh")
+
+
+def test_full_table_drops_new_values():
+    with shared_values.SharedValueTable(capacity=1) as table:
+        assert table.update(b"a", ObisCode(1, 0, 1, 8, 0), 1.0, 0, 30, 1.0)
+        assert not table.update(b"a", ObisCode(1, 0, 2, 8, 0), 1.0, 0, 30, 1.0)
+
+
+def test_publish_stage():
+    sml_file = sml_reader.SmlReader(raw_sml).read_sml_file()
+
+    with shared_values.SharedValueTable() as table:
+        assert collect(shared_values.publish(iterate(sml_file), table)) == [sml_file]
+        with shared_values.SharedValueReader(table.name) as reader:
+            assert len(reader.read_all()) == 7
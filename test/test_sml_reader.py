@@ -6,17 +6,10 @@ import pytest
 import smlpy
 from smlpy import sml_reader
 from smlpy import errors
+from smlpy import obis
 
-raw_sml = (
-    "1b1b1b1b01010101760700110bf402df620062007263010176010107001103c500f50b0901454d4800007514c401016375f3007"
-    "60700110bf402e0620062007263070177010b0901454d4800007514c4070100620affff7262016503c5853c7a77078181c78203"
-    "ff0101010104454d480177070100000009ff010101010b0901454d4800007514c40177070100010800ff6401018201621e52ff5"
-    "600051bdfde0177070100020800ff6401018201621e52ff5600000006070177070100010801ff0101621e52ff5600051bdfde017"
-    "7070100020801ff0101621e52ff5600000006070177070100010802ff0101621e52ff5600000000000177070100020802ff010162"
-    "1e52ff5600000000000177070100100700ff0101621b52ff55000014f40177078181c78205ff010101018302957c486aaf8c92a2"
-    "57ec681e215fddeff32a2dbf2c8a88721777f5f01e5ed5ccaa694dd48c14dc5589d28e0c5b9ce88e01010163b4c800760700110"
-    "bf402e362006200726302017101634e85001b1b1b1b1a000337"
-)
+from test.data import raw_sml
+from test.data import server_id as server_id_bytes
 
 
 def get_test_files():
@@ -50,7 +43,28 @@ def test_own_data():
     assert data.val_list[2].value == 85712862
     assert data.val_list[2].unit == "Wh"
     assert data.val_list[2].scaler == -1
-    assert data.val_list[2].obj_name == "1-0.1.8.1"
+    assert data.val_list[2].obj_name == obis.ObisCode(1, 0, 1, 8, 0, 255)
+    assert str(data.val_list[2].obj_name) == "1-0.1.8.0"
+    assert data.list_name == obis.ObisCode.from_hex("0100620affff")
+
+
+def test_get_value_by_obis_id():
+    reader = smlpy.SmlReader(raw_sml)
+    reader.read_sml_file()
+
+    entries = reader.get_value_by_obis_id("1-0:1.8.e")
+    assert [str(x.obj_name) for x in entries] == ["1-0.1.8.0", "1-0.1.8.1", "1-0.1.8.2"]
+    assert entries[0].get_obis_explanation() == "Zählwerk positive Wirkenergie, tariflos"
+    assert reader.get_value_by_obis_id(obis.ObisCode(1, 0, 16, 7, 0))[0].value == 5364
+
+
+def test_server_id_to_bytes():
+    sml_file = smlpy.SmlReader(raw_sml).read_sml_file()
+    server_id, _, _ = next(sml_file.get_numeric_values())
+
+    assert sml_reader.server_id_to_bytes(server_id) == server_id_bytes
+    assert sml_reader.server_id_to_bytes(server_id_bytes) == server_id_bytes
+    assert sml_reader.server_id_to_bytes(None) == b""
 
 
 @pytest.mark.skip("manual only")
@@ -85,3 +99,4 @@ def test_can_dump():
         data["data"][1]["message_body"]["val_list"][4]["scaled_value"]
         == 8571286.200000001
     )
+    assert data["data"][1]["message_body"]["val_list"][4]["obj_name"] == "1-0.1.8.1"
@@ -0,0 +1,111 @@
+import asyncio
+
+from smlpy import parse_cache, tcp_reader
+
+from test.data import raw_sml
+
+frame = bytes.fromhex(raw_sml)
+
+
+def test_reads_many_connections():
+    async def run():
+        server = await tcp_reader.replay_server(frame * 2, interval=0.05)
+        port = server.sockets[0].getsockname()[1]
+        settings = [tcp_reader.TcpSettings("127.0.0.1", port) for _ in range(200)]
+
+        results = tcp_reader.main(settings)
+        count = 0
+        async for sml_file in results:
+            assert len(sml_file.data) == 3
+            count += 1
+            if count == 1000:
+                break
+        await results.aclose()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(asyncio.wait_for(run(), 30))
+
+
+def test_hosts_share_the_cache():
+    cache = parse_cache.ParseCache()
+
+    async def run():
+        server = await tcp_reader.replay_server(frame, interval=0.01)
+        port = server.sockets[0].getsockname()[1]
+        settings = [tcp_reader.TcpSettings("127.0.0.1", port) for _ in range(2)]
+
+        results = tcp_reader.main(settings, cache=cache)
+        sml_files = [await results.__anext__() for _ in range(10)]
+        await results.aclose()
+        server.close()
+        return sml_files
+
+    sml_files = asyncio.run(asyncio.wait_for(run(), 10))
+
+    assert all(x is sml_files[0] for x in sml_files)
+    assert cache.stats().hits == 9
+
+
+def test_skips_corrupt_frames():
+    corrupt = bytes.fromhex("1b1b1b1b01010101" + "62" * 16 + "1b1b1b1b1a000000")
+
+    async def run():
+        good = await tcp_reader.replay_server(frame, interval=0.01)
+        bad = await tcp_reader.replay_server(corrupt, interval=0.01)
+        settings = [
+            tcp_reader.TcpSettings("127.0.0.1", x.sockets[0].getsockname()[1])
+            for x in (bad, good)
+        ]
+
+        results = tcp_reader.main(settings)
+        count = 0
+        async for sml_file in results:
+            assert len(sml_file.data) == 3
+            count += 1
+            if count == 20:
+                break
+        await results.aclose()
+        for server in (good, bad):
+            server.close()
+        return count
+
+    assert asyncio.run(asyncio.wait_for(run(), 10)) == 20
+
+
+def test_reconnects_after_close_and_timeout():
+    connections = []
+
+    async def run():
+        async def handle(reader, writer):
+            connections.append(writer)
+            if len(connections) % 2 == 1:
+                writer.write(frame)  # then stay silent until the read timeout
+            else:
+                writer.write(frame)
+                writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        settings = tcp_reader.TcpSettings(
+            "127.0.0.1", port, read_timeout=0.1, reconnect_min=0.01, reconnect_max=0.02
+        )
+
+        queue = asyncio.Queue()
+        task = asyncio.create_task(await tcp_reader.receive(settings, queue))
+        for _ in range(4):
+            assert await asyncio.wait_for(queue.get(), 2) == raw_sml
+        task.cancel()
+        server.close()
+
+    asyncio.run(run())
+    assert len(connections) >= 4
+
+
+def test_backoff_is_jittered_and_capped():
+    settings = tcp_reader.TcpSettings("localhost", 1, reconnect_min=1, reconnect_max=8)
+
+    delays = [tcp_reader._backoff(settings, 10) for _ in range(100)]
+    assert all(4 <= x <= 8 for x in delays)
+    assert len(set(delays)) > 1
+    assert tcp_reader._backoff(settings, 0) <= 1
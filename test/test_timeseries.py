@@ -0,0 +1,93 @@
+import pytest
+
+from smlpy import sml_reader, timeseries
+from smlpy.obis import ObisCode
+
+from test.data import collect, iterate, raw_sml, server_id
+
+energy = ObisCode(1, 0, 1, 8, 0)
+
+
+def test_column_roundtrip():
+    values = [0, 0, 0, 5, -3, 0, 1 << 40, -(1 << 40), 0]
+
+    assert timeseries._decode_column(timeseries._encode_column(values)) == values
+
+
+def test_append_and_read(tmp_path):
+    store = timeseries.TimeSeriesStore(tmp_path, block_size=100)
+    for i in range(1000):
+        store.append(server_id, energy, 1000.0 + i, 85712862 + i // 3, -1, 30)
+
+    assert len(store._get_series(server_id, energy).index) == 10
+    timestamps, values = store.read_columns(server_id, energy, 1100.0, 1102.0)
+    assert timestamps == [1100.0, 1101.0, 1102.0]
+    assert values == [x * 10 ** -1 for x in [85712862 + 33, 85712862 + 33, 85712862 + 34]]
+
+    store.append(server_id, energy, 2000.5, 1, 0, 30)  # different scaler, still buffered
+    assert list(store.read(server_id, energy, 2000.0)) == [(2000.5, 1)]
+    store.close()
+
+    reopened = timeseries.TimeSeriesStore(tmp_path)
+    assert reopened.series() == [(server_id, energy)]
+    assert len(reopened.read_columns(server_id, energy)[0]) == 1001
+
+
+def test_regular_counter_is_compact(tmp_path):
+    with timeseries.TimeSeriesStore(tmp_path) as store:
+        for i in range(86400):
+            store.append(server_id, energy, 1600000000.0 + i, 85712862 + i // 60, -1, 30)
+
+    data_file = next(tmp_path.glob("*/*.smlts"))
+    assert data_file.stat().st_size < 86400 // 10
+
+
+def test_rebuilds_index_and_drops_partial_block(tmp_path):
+    with timeseries.TimeSeriesStore(tmp_path, block_size=10) as store:
+        for i in range(25):
+            store.append(server_id, energy, float(i), i, 0, 30)
+
+    data_file = next(tmp_path.glob("*/*.smlts"))
+    index_file = next(tmp_path.glob("*/*.smlts.idx"))
+    index_file.unlink()
+    with data_file.open("ab") as f:
+        f.write(b"SMTB\x01")
+
+    data_size = data_file.stat().st_size
+
+    # a reader must not touch the files, the writer might be in the middle of a flush
+    store = timeseries.TimeSeriesStore(tmp_path)
+    timestamps, values = store.read_columns(server_id, energy, 5, 30)
+    assert timestamps == [float(x) for x in range(5, 25)]
+    assert values == list(range(5, 25))
+    assert data_file.stat().st_size == data_size
+    assert not index_file.exists()
+
+    # the writer repairs the files before appending
+    store.append(server_id, energy, 25.0, 25, 0, 30)
+    store.close()
+    assert data_size - 5 < data_file.stat().st_size
+    timestamps, values = timeseries.TimeSeriesStore(tmp_path).read_columns(server_id, energy)
+    assert values == list(range(26))
+
+
+def test_clock_going_back_does_not_stop_recording(tmp_path):
+    sml_file = sml_reader.SmlReader(raw_sml).read_sml_file()
+
+    with timeseries.TimeSeriesStore(tmp_path) as store:
+        store.append_sml_file(sml_file, timestamp=100.0)
+        store.append_sml_file(sml_file, timestamp=50.0)
+
+        timestamps, _ = store.read_columns(server_id, ObisCode(1, 0, 16, 7, 0))
+        assert timestamps == [100.0, 100.0]
+        with pytest.raises(ValueError):
+            store.append(server_id, energy, 50.0, 1, 0, 30)
+
+
+def test_record_stage(tmp_path):
+    sml_file = sml_reader.SmlReader(raw_sml).read_sml_file()
+
+    with timeseries.TimeSeriesStore(tmp_path) as store:
+        assert collect(timeseries.record(iterate(sml_file), store)) == [sml_file]
+        assert len(store.series()) == 7
+        assert store.read_columns(server_id, ObisCode(1, 0, 16, 7, 0))[1] == [536.4]